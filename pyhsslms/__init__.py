@@ -42,19 +42,44 @@ from .pyhsslms import lms_shake_m24_h25
 from .pyhsslms import coef
 from .pyhsslms import checksum
 from .pyhsslms import serialize_list
+from .pyhsslms import WinternitzCodec
+from .pyhsslms import lmots_codec
+
+from .pyhsslms import LmotsChain
 
 from .pyhsslms import LmotsSignature
 from .pyhsslms import LmotsPrivateKey
 from .pyhsslms import LmotsPublicKey
+from .pyhsslms import LmotsCheckpoints
 
 from .pyhsslms import LmsSignature
+from .pyhsslms import LmsSignatureView
 from .pyhsslms import LmsPrivateKey
 from .pyhsslms import LmsPublicKey
+from .pyhsslms import LmsTreehash
+from .pyhsslms import LmsTraversal
+from .pyhsslms import LmsNodeStore
+from .pyhsslms import LmsBuildState
+from .pyhsslms import lms_signature_length
+from .pyhsslms import LmsSigner
+from .pyhsslms import LmsVerifier
+from .pyhsslms import LmsCheckpointCache
 
+from .pyhsslms import hss_params
 from .pyhsslms import HssSignature
+from .pyhsslms import HssSignatureView
 from .pyhsslms import HssPrivateKey
 from .pyhsslms import HssPublicKey
+from .pyhsslms import HssPublicKeyCache
+from .pyhsslms import HssSigner
+from .pyhsslms import HssVerifier
+from .pyhsslms import HssAuxData
+from .pyhsslms import HssKeygenState
+from .pyhsslms import HssKeygenProgress
+from .pyhsslms import HssKeygen
 
 from .pyhsslms import HssLmsSignature
 from .pyhsslms import HssLmsPrivateKey
 from .pyhsslms import HssLmsPublicKey
+
+from .pyhsslms import verify_many
@@ -36,6 +36,7 @@
 # WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import os as _os
 from sys import version_info
 
 if version_info[0] <= 2 or (version_info[0] == 3 and version_info[1] < 6):
@@ -107,3 +108,16 @@ else:
     shake256 = hashlib.shake_256
     NoFileError = FileNotFoundError
     FoundFileError = FileExistsError
+
+
+if hasattr(_os, 'pwrite'):
+    pwrite = _os.pwrite
+else:
+    def pwrite(fd, buf, offset):
+        _os.lseek(fd, offset, 0)
+        return _os.write(fd, buf)
+
+if hasattr(_os, 'replace'):
+    replaceFile = _os.replace
+else:
+    replaceFile = _os.rename
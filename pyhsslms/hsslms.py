@@ -40,10 +40,12 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import sys
+import time
 import os.path
 import argparse
 import pyhsslms
 from .__init__ import __version__ as VERSION
+from .compat import toBytes
 
 
 def usage(name):
@@ -57,9 +59,16 @@ def usage(name):
     print(" ")
     print(cmd_name + " sign <keyname> <filename>")
     print("   updates <keyname>.prv and makes the signature in <filename>.sig")
+    print("   uses the trees saved in <keyname>.aux when it exists")
+    print("   if <filename> is -, signs standard input to standard output")
     print(" ")
-    print(cmd_name + " verify <keyname> <filename>")
+    print(cmd_name + " verify <keyname> <filename> [<sigfile>]")
     print("   verifies the signature in <filename>.sig with <keyname>.pub")
+    print("   if <filename> is -, verifies standard input with <sigfile>")
+    print(" ")
+    print(cmd_name + " verify-batch [-j WORKERS] <listfile>")
+    print("   verifies the signature in <filename>.sig for each line")
+    print("   <keyname> <filename> of <listfile>; - reads standard input")
     print(" ")
     print(cmd_name + " showprv <keyname>")
     print("   display <keyname>.prv")
@@ -74,13 +83,23 @@ def usage(name):
     print("   -l LEVELS, --levels LEVELS")
     print("                           Number of levels in HSS heirarchy")
     print("   -s LMS_TYPE, --lms LMS_TYPE")
-    print("                           Height of the LMS trees")
+    print("                           Height of the LMS trees, or a list")
+    print("                           with one for each level, such as 15,5")
     print("   -w LMOTS_TYPE, --lmots LMOTS_TYPE")
-    print("                           Winternitz number")
+    print("                           Winternitz number, or a list")
+    print("                           with one for each level, such as 8,4")
     print("   -a HASH_ALG, --alg HASH_ALG")
     print("                           Hash algorithm (sha256 or shake)")
     print("   -t TRUNC, --trunc TRUNC")
     print("                           Hash algorithm truncation size")
+    print("   -j WORKERS, --workers WORKERS")
+    print("                           Number of processes computing the trees")
+    print("   -x, --aux")
+    print("                           Save the trees in <keyname>.aux")
+    print("   -c LEAVES, --checkpoint LEAVES")
+    print("                           Save the progress in <keyname>.genkey-state")
+    print("   -r, --resume")
+    print("                           Continue from <keyname>.genkey-state")
     print(" ")
     print("optional command arguments:")
     print("   -h, --help")
@@ -90,11 +109,63 @@ def usage(name):
     sys.exit(1)
 
 
+def parse_list(parser, text, choices):
+    """
+    Parse a comma-separated list of numbers from the command line.
+    """
+    try:
+        rv = [int(item) for item in text.split(',')]
+    except ValueError:
+        parser.error('invalid list: ' + text)
+    for item in rv:
+        if item not in choices:
+            parser.error('invalid choice: %d (choose from %s)' %
+                         (item, ', '.join([str(c) for c in choices])))
+    return rv
+
+
+class ProgressBar(object):
+    """
+    Shows the progress of genkey on standard error, at most a few
+    times a second, when it is a terminal.
+    """
+    width = 30
+
+    def __init__(self, stream=None):
+        if stream is None:
+            stream = sys.stderr
+        self.stream = stream
+        self.shown = 0
+        self.enabled = hasattr(stream, 'isatty') and stream.isatty()
+
+    def __call__(self, progress):
+        if not self.enabled:
+            return
+        now = time.time()
+        if now - self.shown < 0.25 and not progress.done:
+            return
+        self.shown = now
+        done = (ProgressBar.width*progress.leaves) // progress.total
+        line = '\r[' + '#'*done + '.'*(ProgressBar.width - done) + ']'
+        line += ' %3d%%' % ((100*progress.leaves) // progress.total)
+        line += ' %d/%d trees' % (progress.levels_done, progress.levels)
+        line += ' %.0f leaves/s' % progress.rate()
+        eta = progress.eta()
+        if eta is not None and not progress.done:
+            eta = int(eta)
+            line += ' ETA %d:%02d:%02d' % (eta // 3600, (eta // 60) % 60,
+                                          eta % 60)
+        if progress.done:
+            line += ' ' * 16 + '\n'
+        self.stream.write(line)
+        self.stream.flush()
+
+
 def main():
     """
     Command line interface for pyhsslms.py.
     """
-    cmds = ['genkey', 'keygen', 'sign', 'verify', \
+    cmds = ['genkey', 'keygen', 'sign', 'verify', 'verify-batch', \
             'showprv', 'showpub', 'showsig', \
             '--version', '-v', 'version', '--help', '-h', 'help']
 
@@ -121,71 +192,69 @@ def main():
         levels = 2
         lms_type = pyhsslms.lms_sha256_m32_h5
         lmots_type = pyhsslms.lmots_sha256_n32_w8
+        workers = None
+        aux = False
+        checkpoint = None
+        resume = False
+        params = None
         if len(sys.argv) > 3:
             parser = argparse.ArgumentParser()
-            parser.add_argument('-l', '--levels', dest='levels', default=2,
+            parser.add_argument('-l', '--levels', dest='levels', default=None,
                 type=int, choices=[1, 2, 3, 4, 5, 6, 7, 8],
                 metavar='LEVELS', help='Number of levels in HSS heirarchy')
-            parser.add_argument("-s", "--lms", dest='lms', default=5,
-                type=int, choices=[5, 10, 15, 20, 25],
-                metavar='LMS_TYPE', help='Height of the LMS trees')
-            parser.add_argument('-w', '--lmots', dest='lmots', default=8,
-                type=int, choices=[1, 2, 4, 8],
-                metavar='LMOTS_TYPE', help='Winternitz number')
+            parser.add_argument("-s", "--lms", dest='lms', default='5',
+                type=str, metavar='LMS_TYPE',
+                help='Height of the LMS trees, or a list such as 15,5')
+            parser.add_argument('-w', '--lmots', dest='lmots', default='8',
+                type=str, metavar='LMOTS_TYPE',
+                help='Winternitz number, or a list such as 8,4')
             parser.add_argument('-a', '--alg', dest='alg', default='sha256',
                 type=str, choices=['sha256', 'shake'],
                 metavar='HASH_ALG', help='Hash algorithm (sha256 or shake)')
             parser.add_argument('-t', '--trunc', dest='trunc', default='32',
                 type=int, choices=[32, 24],
                 metavar='TRUNC', help='Hash algorithm truncation size')
+            parser.add_argument('-j', '--workers', dest='workers', default=None,
+                type=int, metavar='WORKERS',
+                help='Number of processes computing the trees')
+            parser.add_argument('-x', '--aux', dest='aux', default=False,
+                action='store_true', help='Save the trees in <keyname>.aux')
+            parser.add_argument('-c', '--checkpoint', dest='checkpoint',
+                default=None, type=int, metavar='LEAVES',
+                help='Save the progress in <keyname>.genkey-state')
+            parser.add_argument('-r', '--resume', dest='resume', default=False,
+                action='store_true', help='Continue from <keyname>.genkey-state')
             args = parser.parse_args(sys.argv[3:])
 
+            heights = parse_list(parser, args.lms, [5, 10, 15, 20, 25])
+            ws = parse_list(parser, args.lmots, [1, 2, 4, 8])
             levels = args.levels
-            if args.alg == 'sha256':
-                if args.trunc == 32:
-                     if args.lms ==  5: lms_type = pyhsslms.lms_sha256_m32_h5
-                     if args.lms == 10: lms_type = pyhsslms.lms_sha256_m32_h10
-                     if args.lms == 15: lms_type = pyhsslms.lms_sha256_m32_h15
-                     if args.lms == 20: lms_type = pyhsslms.lms_sha256_m32_h20
-                     if args.lms == 25: lms_type = pyhsslms.lms_sha256_m32_h25
-                     if args.lmots == 1: lmots_type = pyhsslms.lmots_sha256_n32_w1
-                     if args.lmots == 2: lmots_type = pyhsslms.lmots_sha256_n32_w2
-                     if args.lmots == 4: lmots_type = pyhsslms.lmots_sha256_n32_w4
-                     if args.lmots == 8: lmots_type = pyhsslms.lmots_sha256_n32_w8
-                else: # args.trunc == 24
-                     if args.lms ==  5: lms_type = pyhsslms.lms_sha256_m24_h5
-                     if args.lms == 10: lms_type = pyhsslms.lms_sha256_m24_h10
-                     if args.lms == 15: lms_type = pyhsslms.lms_sha256_m24_h15
-                     if args.lms == 20: lms_type = pyhsslms.lms_sha256_m24_h20
-                     if args.lms == 25: lms_type = pyhsslms.lms_sha256_m24_h25
-                     if args.lmots == 1: lmots_type = pyhsslms.lmots_sha256_n24_w1
-                     if args.lmots == 2: lmots_type = pyhsslms.lmots_sha256_n24_w2
-                     if args.lmots == 4: lmots_type = pyhsslms.lmots_sha256_n24_w4
-                     if args.lmots == 8: lmots_type = pyhsslms.lmots_sha256_n24_w8
-            else: # args.alg == 'shake'
-                if args.trunc == 32:
-                     if args.lms ==  5: lms_type = pyhsslms.lms_shake_m32_h5
-                     if args.lms == 10: lms_type = pyhsslms.lms_shake_m32_h10
-                     if args.lms == 15: lms_type = pyhsslms.lms_shake_m32_h15
-                     if args.lms == 20: lms_type = pyhsslms.lms_shake_m32_h20
-                     if args.lms == 25: lms_type = pyhsslms.lms_shake_m32_h25
-                     if args.lmots == 1: lmots_type = pyhsslms.lmots_shake_n32_w1
-                     if args.lmots == 2: lmots_type = pyhsslms.lmots_shake_n32_w2
-                     if args.lmots == 4: lmots_type = pyhsslms.lmots_shake_n32_w4
-                     if args.lmots == 8: lmots_type = pyhsslms.lmots_shake_n32_w8
-                else: # args.trunc == 24
-                     if args.lms ==  5: lms_type = pyhsslms.lms_shake_m24_h5
-                     if args.lms == 10: lms_type = pyhsslms.lms_shake_m24_h10
-                     if args.lms == 15: lms_type = pyhsslms.lms_shake_m24_h15
-                     if args.lms == 20: lms_type = pyhsslms.lms_shake_m24_h20
-                     if args.lms == 25: lms_type = pyhsslms.lms_shake_m24_h25
-                     if args.lmots == 1: lmots_type = pyhsslms.lmots_shake_n24_w1
-                     if args.lmots == 2: lmots_type = pyhsslms.lmots_shake_n24_w2
-                     if args.lmots == 4: lmots_type = pyhsslms.lmots_shake_n24_w4
-                     if args.lmots == 8: lmots_type = pyhsslms.lmots_shake_n24_w8
-        
+            if levels is None:
+                # two levels unless a list gives the number
+                levels = max(len(heights), len(ws))
+                if levels == 1:
+                    levels = 2
+            if len(heights) == 1:
+                heights = heights*levels
+            if len(ws) == 1:
+                ws = ws*levels
+            if len(heights) != levels or len(ws) != levels:
+                parser.error('the lists must have one item for each level')
+            workers = args.workers
+            aux = args.aux
+            checkpoint = args.checkpoint
+            resume = args.resume
+            params = []
+            for h, w in zip(heights, ws):
+                params.append((
+                    getattr(pyhsslms, 'lms_%s_m%d_h%d' % (args.alg, args.trunc, h)),
+                    getattr(pyhsslms, 'lmots_%s_n%d_w%d' % (args.alg, args.trunc, w))))
+            lms_type, lmots_type = params[0]
+
         pyhsslms.HssLmsPrivateKey.genkey(keyname, levels=levels,
-            lms_type=lms_type, lmots_type=lmots_type)
+            lms_type=lms_type, lmots_type=lmots_type, workers=workers,
+            aux=aux, checkpoint=checkpoint, resume=resume,
+            progress=ProgressBar(), params=params)
 
     if sys.argv[1] == 'sign':
         if len(sys.argv) < 3:
@@ -200,8 +269,15 @@ def main():
 
         keyname = sys.argv[2]
         filename = sys.argv[3]
+        prv = pyhsslms.HssLmsPrivateKey(keyname,
+                  aux=os.path.exists(keyname + '.aux'))
+        if filename == '-':
+            # the signature is written to standard output
+            if not prv.signFile(filename):
+                sys.stderr.write("Signing failed!\n")
+                sys.exit(1)
+            sys.exit(0)
         print("Signing " + filename + " ...")
-        prv = pyhsslms.HssLmsPrivateKey(keyname)
         if prv.signFile(filename):
             print("   ... Success. Signature saved in " + filename + ".sig")
         else:
@@ -220,12 +296,75 @@ def main():
 
         keyname = sys.argv[2]
         filename = sys.argv[3]
+        sig_filename = None
+        if len(sys.argv) > 4:
+            sig_filename = sys.argv[4]
+        elif filename == '-':
+            print("error: fourth argument must be a signature file name")
+            usage(sys.argv[0])
+            sys.exit(1)
         pub = pyhsslms.HssLmsPublicKey(keyname)
-        if pub.verifyFile(filename):
-            print("Signature in " + filename + ".sig is valid.")
+        if pub.verifyFile(filename, sig_filename):
+            print("Signature in " + (sig_filename or filename + ".sig") + \
+                  " is valid.")
         else:
             print("Signature verification failed!")
 
+    if sys.argv[1] == 'verify-batch':
+        parser = argparse.ArgumentParser()
+        parser.add_argument('-j', '--workers', dest='workers', default=None,
+            type=int, metavar='WORKERS',
+            help='Number of processes verifying the signatures')
+        parser.add_argument('listfile', metavar='LISTFILE')
+        args = parser.parse_args(sys.argv[2:])
+
+        if args.listfile == '-':
+            listfile = sys.stdin
+        else:
+            try:
+                listfile = open(args.listfile, 'r')
+            except IOError:
+                print("error: cannot read " + args.listfile)
+                usage(sys.argv[0])
+                sys.exit(1)
+        keys = {}
+        names = []
+
+        def read_items():
+            # the lines are read as the signatures are verified
+            for line in listfile:
+                fields = line.rstrip('\r\n').split(None, 1)
+                if len(fields) < 2:
+                    continue
+                keyname, filename = fields
+                if keyname not in keys:
+                    try:
+                        keys[keyname] = pyhsslms.HssLmsPublicKey(keyname)
+                    except (IOError, OSError, ValueError):
+                        # an empty public key fails to verify
+                        keys[keyname] = toBytes('')
+                names.append(filename)
+                yield (keys[keyname], u'' + filename,
+                       u'' + filename + '.sig')
+
+        stats = {}
+        failed = 0
+        for index, ok in pyhsslms.verify_many(read_items(),
+                                              workers=args.workers,
+                                              stats=stats):
+            if ok:
+                print(names[index] + ": valid")
+            else:
+                print(names[index] + ": verification failed!")
+                failed += 1
+        if listfile is not sys.stdin:
+            listfile.close()
+        print("%d signatures, %d valid, %d failed, %.1f per second" % \
+              (stats['verified'], stats['valid'], stats['invalid'],
+               stats['per_second']))
+        if failed:
+            sys.exit(1)
+
     if sys.argv[1] == 'showprv':
         if len(sys.argv) < 3:
             print("error: second argument must be a keyname")
@@ -233,7 +372,7 @@ def main():
             sys.exit(1)
 
         keyname = sys.argv[2]
-        prv = pyhsslms.HssLmsPrivateKey(keyname)
+        prv = pyhsslms.HssLmsPrivateKey(keyname, lazy=True)
         print("Private Key: " + keyname + ".prv")
         print(prv.hss_prv.prettyPrint())
 
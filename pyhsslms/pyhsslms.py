@@ -5,10 +5,12 @@
 # C code made available by Cisco Systems, Inc. in GitHub at
 # https://github.com/cisco/hash-sigs/
 #
-# For simplicity of the interfaces, all of the trees in the HSS
-# private key hierarchy are the same size; however, the signature
-# verification code works correctly on signatures that are generated
-# by another program that allows different tree sizes in the hierarchy.
+# By default all of the trees in the HSS private key hierarchy are
+# the same size, but each level can be given its own LMS and LM-OTS
+# types, such as a tall top tree and a short bottom tree.  The
+# signature verification code works correctly on signatures that are
+# generated by another program that allows different tree sizes in
+# the hierarchy.
 #
 #
 # Copyright (c) 2020-2023, Vigil Security, LLC
@@ -45,10 +47,17 @@
 
 
 import os
+import sys
+import time
+import mmap
 import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
 from .compat import NoFileError, FoundFileError
 from .compat import randBytes, toBytes, toHex, fromHex
 from .compat import charNum, u32, u16, u8, int32, shake256
+from .compat import pwrite, replaceFile
 
 
 # ----------------------------------------------------------------------
@@ -168,6 +177,7 @@ err_bad_number_of_levels  = 'unsupported number of levels'
 err_private_key_exhausted = 'private key is exhausted'
 err_algorithm_mismatch    = 'LMOTS and LMS with different hash algorithms'
 err_prv_key_deserialize   = 'root private key not recognized'
+err_finalized             = 'signer or verifier is already finalized'
 
 # ----------------------------------------------------------------------
 # The internal utility routines
@@ -263,6 +273,57 @@ def checksum(x, w, ls):
     return u16(sum << ls)
 
 
+class WinternitzCodec(object):
+    """
+    Expands a message hash and its checksum into the p coefficients
+    used by LM-OTS, with tables of the coefficients and the checksum
+    terms of every byte value.  It gives the same values as coef() and
+    checksum(), which are the reference.
+    """
+    def __init__(self, w, ls, p):
+        self.w = w
+        self.ls = ls
+        self.p = p
+        top = (2**w)-1
+        self.table = []
+        self.sums = []
+        for b in range(0, 256):
+            digits = tuple(top & (b >> (8-(w*(k+1)))) for k in range(0, 8//w))
+            self.table.append(digits)
+            self.sums.append(sum(top - d for d in digits))
+
+    def digits(self, hash1):
+        """
+        :param hash1: the message hash, n bytes
+        :return: a list of the p coefficients of hash1 || checksum
+        """
+        table = self.table
+        sums = self.sums
+        rv = []
+        total = 0
+        for b in bytearray(hash1):
+            rv.extend(table[b])
+            total += sums[b]
+        for b in bytearray(u16(total << self.ls)):
+            rv.extend(table[b])
+        return rv[0:self.p]
+
+
+_codecs = {}
+
+
+def lmots_codec(lmots_type):
+    """
+    The WinternitzCodec for an LM-OTS type; one is made for each type
+    """
+    codec = _codecs.get(lmots_type)
+    if codec is None:
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        codec = WinternitzCodec(w, ls, p)
+        _codecs[lmots_type] = codec
+    return codec
+
+
 def serialize_list(l):
     """
     Concatenate the list members one after another
@@ -279,6 +340,116 @@ def serialize_list(l):
 # The LM-OTS routines
 # ----------------------------------------------------------------------
 
+# The u8(j) values used in the Winternitz chains, computed once
+#
+chain_steps = [u8(j) for j in range(0, 256)]
+
+
+class LmotsChain(object):
+    """
+    Winternitz chain engine for the LM-OTS key pair identified by I and q.
+
+    The hash state after I || q is computed once; each chain clones it
+    and absorbs u16(i), and each step clones the chain prefix and
+    absorbs u8(j) || tmp.  The step routine is selected once, based on
+    the hash algorithm and output length of the LM-OTS type.
+    """
+    def __init__(self, lmots_type, I, q):
+        if lmots_type not in lmots_params:
+            raise ValueError(err_unknown_typecode, toHex(lmots_type))
+        if len(I) != LenI:
+            raise ValueError(err_bad_length, str(len(I)))
+        if len(q) != LenQ:
+            raise ValueError(err_bad_length, str(len(q)))
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        self.type = lmots_type
+        self.alg = alg
+        self.n = n
+        self.p = p
+        self.top = (2**w)-1
+        self.I = I
+        self.q = q
+        self._base = H_start(alg)
+        if hasattr(self._base, 'copy'):
+            H_update(self._base, I + q)
+            if alg == 'sha256' and n == 32:
+                self.run = self._run_sha256
+            elif alg == 'sha256':
+                self.run = self._run_sha256_truncated
+            else:
+                self.run = self._run_shake256
+        else:
+            # hash objects that cannot be cloned, such as the SHAKE256
+            # wrapper used with older versions of Python
+            self._base = None
+            self.run = self._run_generic
+
+    def _prefix(self, i):
+        h = self._base.copy()
+        h.update(u16(i))
+        return h
+
+    def _run_sha256(self, i, tmp, start, end):
+        if start < end:
+            copy = self._prefix(i).copy
+            for j in range(start, end):
+                h = copy()
+                h.update(chain_steps[j] + tmp)
+                tmp = h.digest()
+        return tmp
+
+    def _run_sha256_truncated(self, i, tmp, start, end):
+        if start < end:
+            copy = self._prefix(i).copy
+            n = self.n
+            for j in range(start, end):
+                h = copy()
+                h.update(chain_steps[j] + tmp)
+                tmp = h.digest()[0:n]
+        return tmp
+
+    def _run_shake256(self, i, tmp, start, end):
+        if start < end:
+            copy = self._prefix(i).copy
+            n = self.n
+            for j in range(start, end):
+                h = copy()
+                h.update(chain_steps[j] + tmp)
+                tmp = h.digest(n)
+        return tmp
+
+    def _run_generic(self, i, tmp, start, end):
+        prefix = self.I + self.q + u16(i)
+        for j in range(start, end):
+            tmp = H(self.alg, prefix + chain_steps[j] + tmp, self.n)
+        return tmp
+
+    def start(self, i, SEED):
+        """
+        Compute x_q[i], the start of chain i, from the private SEED
+        :param i: the chain number (an integer)
+        :param SEED: the LM-OTS private seed
+        :return: the private chain value, n bytes
+        """
+        if self._base is None:
+            return H(self.alg, self.I + self.q + u16(i) + D_PRG + SEED, self.n)
+        h = self._prefix(i)
+        h.update(D_PRG + SEED)
+        return H_finish(h, self.n)
+
+    def publicKey(self, ends):
+        """
+        Compress the chain ends into the LM-OTS public key value K
+        :param ends: the p chain end values
+        :return: the K value, n bytes
+        """
+        hash = H_start(self.alg)
+        H_update(hash, self.I + self.q + D_PBLC)
+        for tmp in ends:
+            H_update(hash, tmp)
+        return H_finish(hash, self.n)
+
+
 class LmotsSignature():
     """
     Leighton-Micali One Time Signature
@@ -298,15 +469,21 @@ class LmotsSignature():
         if len(q) != LenQ:
             raise ValueError(err_bad_length, str(len(q)))
         hash1 = H(alg, I + q + D_MESG + self.C + message, n)
-        V = hash1 + checksum(hash1, w, ls)
-        hash = H_start(alg)
-        H_update(hash, I + q + D_PBLC)
-        for i, y in enumerate(self.y):
-            tmp = y
-            for j in range(coef(V, i, w), (2**w)-1):
-                tmp = H(alg, I + q + u16(i) + u8(j) + tmp, n)
-            H_update(hash, tmp)
-        return H_finish(hash, n)
+        return self.buildPublicDigest(I, q, hash1)
+
+    def buildPublicDigest(self, I, q, hash1):
+        """
+        Compute the candidate public key value Kc from the message hash
+        :param I: the LMS key identifier
+        :param q: the leaf number, 4 bytes
+        :param hash1: H(I || q || D_MESG || C || message), n bytes
+        :return: the Kc value, n bytes
+        """
+        digits = lmots_codec(self.type).digits(hash1)
+        chain = LmotsChain(self.type, I, q)
+        top = chain.top
+        return chain.publicKey([chain.run(i, y, digits[i], top)
+                                for i, y in enumerate(self.y)])
 
     @classmethod
     def deserialize(cls, buffer):
@@ -376,6 +553,8 @@ class LmotsPrivateKey:
                 raise ValueError(err_bad_length, str(len(SEED)))
             self.SEED = SEED
         self._signatures_remaining = 1
+        # an LmotsCheckpoints for this key, used once by sign
+        self.checkpoints = None
 
     def remaining(self):
         return self._signatures_remaining
@@ -384,15 +563,11 @@ class LmotsPrivateKey:
         return not bool(self._signatures_remaining)
 
     def publicKey(self): 
-        alg, n, p, w, ls = lmots_params[self.type]
-        hash = H_start(alg)
-        H_update(hash, self.I + self.q + D_PBLC)
-        for i in range(0, p):
-            tmp = H(alg, self.I + self.q + u16(i) + D_PRG + self.SEED, n)
-            for j in range(0, (2**w)-1):
-                tmp = H(alg, self.I + self.q + u16(i) + u8(j) + tmp, n)
-            H_update(hash, tmp)
-        return LmotsPublicKey(self.I, self.q, H_finish(hash, n), self.type)
+        chain = LmotsChain(self.type, self.I, self.q)
+        top = chain.top
+        K = chain.publicKey([chain.run(i, chain.start(i, self.SEED), 0, top)
+                             for i in range(0, chain.p)])
+        return LmotsPublicKey(self.I, self.q, K, self.type)
 
     def sign(self, message):
         if self._signatures_remaining != 1:
@@ -400,15 +575,57 @@ class LmotsPrivateKey:
         alg, n, p, w, ls = lmots_params[self.type]
         C = randBytes(n)
         hash1 = H(alg, self.I + self.q + D_MESG + C + message, n)
-        V = hash1 + checksum(hash1, w, ls)
-        y = []
-        for i in range(0, p):
-            tmp = H(alg, self.I + self.q + u16(i) + D_PRG + self.SEED, n)
-            for j in range(0, coef(V, i, w)):
-                tmp = H(alg, self.I + self.q + u16(i) + u8(j) + tmp, n)
-            y.append(tmp)
+        return self.signDigest(C, hash1)
+
+    def signDigest(self, C, hash1):
+        """
+        Sign the message hash that was computed with the randomizer C
+        :param C: the randomizer, n bytes
+        :param hash1: H(I || q || D_MESG || C || message), n bytes
+        :return: the serialized LM-OTS signature
+        """
+        return LmotsSignature(C, self._chains(hash1), self.type).serialize()
+
+    def signDigestInto(self, C, hash1, out, offset=0):
+        """
+        Sign the message hash like signDigest(), writing the signature
+        into out instead of returning it
+        :param C: the randomizer, n bytes
+        :param hash1: H(I || q || D_MESG || C || message), n bytes
+        :param out: a bytearray or writable memoryview with room for
+            the signature at offset
+        :param offset: where the signature starts in out
+        :return: the offset after the signature
+        """
+        y = self._chains(hash1)
+        pos = offset + 4 + len(C)
+        out[offset:offset+4] = self.type
+        out[offset+4:pos] = C
+        for value in y:
+            out[pos:pos+len(value)] = value
+            pos += len(value)
+        return pos
+
+    # Computes the chain values y of the signature, once
+    #
+    def _chains(self, hash1):
+        if self._signatures_remaining != 1:
+            raise ValueError(err_private_key_exhausted)
+        digits = lmots_codec(self.type).digits(hash1)
+        chain = LmotsChain(self.type, self.I, self.q)
+        checkpoints = self.checkpoints
+        if checkpoints is None:
+            y = [chain.run(i, chain.start(i, self.SEED), 0, a)
+                 for i, a in enumerate(digits)]
+        else:
+            y = []
+            for i, a in enumerate(digits):
+                tmp, step = checkpoints.value(i, a)
+                y.append(chain.run(i, tmp, step, a))
+            checkpoints.wipe()
+            self.checkpoints = None
         self._signatures_remaining = 0
-        return LmotsSignature(C, y, self.type).serialize()
+        return y
 
     def prettyPrint(self):
         rv = "LMOTS private key\n"
@@ -419,6 +636,54 @@ class LmotsPrivateKey:
         return rv
 
 
+class LmotsCheckpoints(object):
+    """
+    The values of the LM-OTS chains of one key every interval steps, so
+    that signing runs at most interval-1 steps for each chain.  The
+    values are held in a bytearray, which is zeroed by wipe().
+    """
+    def __init__(self, lmots_type, I, q, SEED, interval):
+        if interval < 1:
+            raise ValueError(err_bad_value, str(interval))
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        self.n = n
+        self.interval = interval
+        self.count = ((2**w) - 1)//interval + 1
+        self.buffer = bytearray(p * self.count * n)
+        chain = LmotsChain(lmots_type, I, q)
+        pos = 0
+        for i in range(0, p):
+            tmp = chain.start(i, SEED)
+            for k in range(0, self.count):
+                if k > 0:
+                    tmp = chain.run(i, tmp, (k-1)*interval, k*interval)
+                self.buffer[pos:pos+n] = tmp
+                pos += n
+
+    @staticmethod
+    def defaultInterval(lmots_type):
+        """
+        The interval of about sqrt(2^w) steps, which balances the
+        memory of the checkpoints with the steps that signing runs
+        :param lmots_type: the LM-OTS type
+        :return: 2^(w//2): 1, 2, 4, and 16 for w of 1, 2, 4, and 8
+        """
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        return 2**(w//2)
+
+    def value(self, i, a):
+        """
+        The last checkpoint of chain i at or before step a
+        :return: the chain value and its step
+        """
+        k = min(a//self.interval, self.count - 1)
+        pos = ((i * self.count) + k) * self.n
+        return bytes(self.buffer[pos:pos+self.n]), k*self.interval
+
+    def wipe(self):
+        self.buffer[:] = bytearray(len(self.buffer))
+
+
 class LmotsPublicKey:
     """
     Leighton-Micali One Time Signature Public Key
@@ -435,14 +700,11 @@ class LmotsPublicKey:
             raise ValueError(err_unknown_typecode)
         alg, n, p, w, ls = lmots_params[self.type]
         hash1 = H(alg, self.I + self.q + D_MESG + signature.C + message, n)
-        V = hash1 + checksum(hash1, w, ls)
-        hash = H_start(alg)
-        H_update(hash, self.I + self.q + D_PBLC)
-        for i, tmp in enumerate(signature.y):
-            for j in range(coef(V, i, w), (2**w)-1):
-                tmp = H(alg, self.I + self.q + u16(i) + u8(j) + tmp, n)
-            H_update(hash, tmp)
-        return self.K == H_finish(hash, n)
+        digits = lmots_codec(self.type).digits(hash1)
+        chain = LmotsChain(self.type, self.I, self.q)
+        top = chain.top
+        return self.K == chain.publicKey([chain.run(i, y, digits[i], top)
+                                          for i, y in enumerate(signature.y)])
 
     def serialize(self):
         return self.type + self.I + self.q + self.K 
@@ -578,12 +840,532 @@ class LmsSignature():
         return rv
 
 
+class LmsSignatureView(object):
+    """
+    The offsets of the fields of an LMS signature within a buffer.  The
+    buffer is not copied; bytes, bytearray, mmap, and memoryview are
+    accepted.  If exact is True, the signature must end the buffer.
+    """
+    def __init__(self, buffer, offset=0, exact=True):
+        if not isinstance(buffer, memoryview):
+            buffer = memoryview(buffer)
+        self.buffer = buffer
+        self.offset = offset
+        if len(buffer) < offset+8:
+            raise ValueError(err_bad_length, str(len(buffer)))
+        self.q = int32(buffer[offset:offset+4].tobytes())
+        self.lmots_type = buffer[offset+4:offset+8].tobytes()
+        if self.lmots_type not in lmots_params:
+            raise ValueError(err_unknown_typecode, toHex(self.lmots_type))
+        alg, n, p, w, ls = lmots_params[self.lmots_type]
+        self.n = n
+        self.p = p
+        self.C_pos = offset+8
+        self.y_pos = self.C_pos+n
+        pos = self.y_pos+(n*p)
+        if len(buffer) < pos+4:
+            raise ValueError(err_bad_length, str(len(buffer)))
+        self.lms_type = buffer[pos:pos+4].tobytes()
+        if self.lms_type not in lms_params:
+            raise ValueError(err_unknown_typecode, toHex(self.lms_type))
+        alg2, m, h = lms_params[self.lms_type]
+        if (alg != alg2):
+            raise ValueError(err_algorithm_mismatch, alg + ' and ' + alg2)
+        if (self.q >= 2**h):
+            raise ValueError(err_bad_value, str(self.q))
+        self.m = m
+        self.h = h
+        self.path_pos = pos+4
+        self.end = self.path_pos+(m*h)
+        if exact and len(buffer) != self.end:
+            raise ValueError(err_bad_value, str(len(buffer)))
+        if len(buffer) < self.end:
+            raise ValueError(err_bad_length, str(len(buffer)))
+
+    # The fields are memoryview slices of the buffer; callers that
+    # need bytes call tobytes()
+    #
+    def C(self):
+        return self.buffer[self.C_pos:self.C_pos+self.n]
+
+    def y(self, i):
+        pos = self.y_pos+(i*self.n)
+        return self.buffer[pos:pos+self.n]
+
+    def path(self, i):
+        pos = self.path_pos+(i*self.m)
+        return self.buffer[pos:pos+self.m]
+
+
+class LmsTreehash(object):
+    """
+    Treehash computation of node r of an LMS tree.  The leaves below r
+    are computed one at a time, in order, and the stack holds at most
+    one pending node per level.  The observer, if any, is called with
+    the node number and value of every node that is computed.  The
+    roots, if any, are subtrees below r that are already done; their
+    leaves are skipped.
+    """
+    def __init__(self, lms_type, lmots_type, I, SEED, r, observer=None,
+                 node=None, roots=None):
+        alg2, m, h = lms_params[lms_type]
+        self.lms_type = lms_type
+        self.lmots_type = lmots_type
+        self.I = I
+        self.SEED = SEED
+        self.r = r
+        self.target_height = h - (r.bit_length() - 1)
+        self.leaf = (r << self.target_height) - (2**h)
+        self.end = self.leaf + (2**self.target_height)
+        self.stack = []
+        self.node = node
+        self.observer = observer
+        # the roots below r by their first leaf
+        self._done = {}
+        if roots:
+            for s in roots:
+                shift = s.bit_length() - r.bit_length()
+                if shift < 0 or (s >> shift) != r:
+                    continue
+                height = h - (s.bit_length() - 1)
+                self._done[(s << height) - (2**h)] = (s, roots[s])
+
+    @property
+    def done(self):
+        return self.node is not None
+
+    def roots(self):
+        """
+        The subtrees below r that are done
+        :return: a dict of node numbers and values
+        """
+        if self.node is not None:
+            return {self.r: self.node}
+        rv = dict(self.stack)
+        for s, value in self._done.values():
+            rv[s] = value
+        return rv
+
+    def height(self):
+        """
+        The height of the lowest node on the stack, the target height
+        when nothing is on the stack, and None when the node is done
+        """
+        if self.node is not None:
+            return None
+        if not self.stack:
+            return self.target_height
+        alg2, m, h = lms_params[self.lms_type]
+        return h - (self.stack[-1][0].bit_length() - 1)
+
+    def update(self):
+        """
+        Compute the next leaf and combine the nodes on the stack
+        """
+        if self.node is not None:
+            return
+        alg2, m, h = lms_params[self.lms_type]
+        if self.leaf in self._done:
+            r, value = self._done.pop(self.leaf)
+            self.leaf += 2**(h - (r.bit_length() - 1))
+        else:
+            K = LmotsPrivateKey(I=self.I, q=u32(self.leaf), SEED=self.SEED,
+                                lmots_type=self.lmots_type).publicKey().K
+            r = self.leaf + (2**h)
+            value = H(alg2, self.I + u32(r) + D_LEAF + K, m)
+            self.leaf += 1
+        stack = self.stack
+        while True:
+            if self.observer is not None:
+                self.observer(r, value)
+            if not (r % 2) or not stack or stack[-1][0] != r - 1:
+                break
+            left = stack.pop()[1]
+            r = r//2
+            value = H(alg2, self.I + u32(r) + D_INTR + left + value, m)
+        if r == self.r:
+            self.node = value
+        else:
+            stack.append((r, value))
+
+    def run(self):
+        """
+        Finish the computation
+        :return: the value of node r
+        """
+        while self.node is None:
+            self.update()
+        return self.node
+
+
+class LmsTraversal(object):
+    """
+    Authentication path traversal for the lower levels of an LMS tree,
+    following Szydlo, "Merkle Tree Traversal in Log Space and Time".
+    One treehash instance per level computes the next authentication
+    node at that level, and each call to advance() spends a fixed
+    budget of leaf computations on the instances with the lowest
+    pending nodes.  Memory is O(levels) nodes.
+    """
+    def __init__(self, lms_type, lmots_type, I, SEED, q, levels, nodes,
+                 budget=None):
+        alg2, m, h = lms_params[lms_type]
+        self.lms_type = lms_type
+        self.lmots_type = lmots_type
+        self.I = I
+        self.SEED = SEED
+        self.levels = levels
+        # with fewer leaves for each signature, a treehash instance can
+        # be late, and advance() would have no node for the path
+        if budget is None:
+            budget = max(1, (2*levels)-1)
+        if budget < (2*levels)-1:
+            raise ValueError(err_bad_value, str(budget))
+        self.budget = budget
+        self.auth = []
+        self.treehash = []
+        for t in range(0, levels):
+            self.auth.append(nodes[LmsTraversal.authNode(h, q, t)])
+            r = LmsTraversal.nextNode(h, q, t)
+            if r is None:
+                self.treehash.append(None)
+            else:
+                self.treehash.append(self._treehash(r, nodes.get(r)))
+
+    @staticmethod
+    def authNode(h, q, t):
+        """
+        The node number of the authentication path node at height t
+        for leaf q
+        """
+        return (((2**h) + q) >> t) ^ 1
+
+    @staticmethod
+    def nextNode(h, q, t):
+        """
+        The node number of the next authentication path node at height t
+        for leaf q, or None when there is not one
+        """
+        index = ((q >> t) + 1) ^ 1
+        if index >= 2**(h-t):
+            return None
+        return (2**(h-t)) + index
+
+    def _treehash(self, r, node=None):
+        return LmsTreehash(self.lms_type, self.lmots_type, self.I,
+                           self.SEED, r, node=node)
+
+    def path(self):
+        return list(self.auth)
+
+    def advance(self, s):
+        """
+        Move from the authentication path for leaf s to the one for
+        leaf s+1
+        """
+        alg2, m, h = lms_params[self.lms_type]
+        if s+1 >= 2**h:
+            return
+        for t in range(0, self.levels):
+            if (s+1) % (2**t):
+                continue
+            # the schedule of Szydlo's algorithm, with 2*levels-1 leaves
+            # for each signature, always finishes the treehash for this
+            # level by now, so no signature computes a whole subtree
+            if not self.treehash[t].done:
+                raise ValueError(err_bad_value, str(self.budget))
+            self.auth[t] = self.treehash[t].node
+            r = LmsTraversal.nextNode(h, s+1, t)
+            if r is None:
+                self.treehash[t] = None
+            else:
+                self.treehash[t] = self._treehash(r)
+        for k in range(0, self.budget):
+            lowest = None
+            for t in range(0, self.levels):
+                if self.treehash[t] is None:
+                    continue
+                height = self.treehash[t].height()
+                if height is not None and (lowest is None or height < lowest[0]):
+                    lowest = (height, t)
+            if lowest is None:
+                break
+            self.treehash[lowest[1]].update()
+
+
+def _lms_subtree(args):
+    """
+    Compute the root of one subtree in a worker process
+    :param args: the LMS and LM-OTS types, I, SEED, the subtree root
+        node number, the node numbers that the caller keeps, and the
+        subtrees below the root that are already done
+    :return: the node number, its value, and the kept nodes
+    """
+    lms_type, lmots_type, I, SEED, r, top, wanted, roots = args
+    kept = {}
+    def observer(node_num, value):
+        if node_num < top or node_num in wanted:
+            kept[node_num] = value
+    value = LmsTreehash(lms_type, lmots_type, I, SEED, r,
+                        observer=observer, roots=roots).run()
+    return r, value, kept
+
+
+class LmsNodeStore(object):
+    """
+    The nodes of one LMS tree in a fixed layout: node r is the m bytes
+    at offset + r*m of the buffer.  The buffer may be a bytearray or an
+    mmap, so a tree can be kept in memory or in a file, and saved or
+    loaded with one copy.  If count is given, only the nodes below
+    count are held, such as the top levels of the tree.
+    """
+    def __init__(self, lms_type, buffer=None, offset=0, count=None):
+        alg2, m, h = lms_params[lms_type]
+        self.lms_type = lms_type
+        self.m = m
+        if count is None:
+            count = 2**(h+1)
+        self.count = count
+        if buffer is None:
+            buffer = bytearray(count*m)
+        self.buffer = buffer
+        self.offset = offset
+        # an mmap is not wrapped, so that it can still be closed
+        self._view = None
+        if isinstance(buffer, bytearray):
+            self._view = memoryview(buffer)
+
+    @staticmethod
+    def sizeof(lms_type):
+        alg2, m, h = lms_params[lms_type]
+        return (2**(h+1))*m
+
+    def __contains__(self, r):
+        return 0 < r < self.count
+
+    def __len__(self):
+        return self.count - 1
+
+    def __getitem__(self, r):
+        if not 0 < r < self.count:
+            raise KeyError(r)
+        pos = self.offset + (r*self.m)
+        if self._view is not None:
+            return self._view[pos:pos+self.m].tobytes()
+        return self.buffer[pos:pos+self.m]
+
+    def __setitem__(self, r, value):
+        if not 0 < r < self.count:
+            raise KeyError(r)
+        if len(value) != self.m:
+            raise ValueError(err_bad_length, str(len(value)))
+        pos = self.offset + (r*self.m)
+        self.buffer[pos:pos+self.m] = value
+
+    def digest(self, key):
+        """
+        Hash the nodes, keyed by a value that only the key holder knows
+        :param key: the bytes hashed before the nodes
+        :return: the SHA-256 hash value
+        """
+        h = hashlib.sha256()
+        h.update(key)
+        pos = self.offset
+        end = self.offset + (self.count*self.m)
+        while pos < end:
+            h.update(self.buffer[pos:min(end, pos + (1 << 20))])
+            pos += (1 << 20)
+        return h.digest()
+
+
+def _need_length(buffer, end):
+    if len(buffer) < end:
+        raise ValueError(err_bad_length, str(len(buffer)))
+
+
+def _subtree_leaves(h, roots):
+    # the number of leaves below the given subtree roots
+    return sum([2**(h - (r.bit_length() - 1)) for r in roots])
+
+
+# Runs the steps of several LMS trees, such as the levels of a HSS key,
+# at the same time.  The subtrees of every tree go to one pool of worker
+# processes: the first step of each tree queues all of its subtrees, so
+# the pool does not drain at the end of each tree.  Gives the index of
+# the tree and the number of its leaves that are done after each step.
+#
+def _tree_steps(prvs, workers):
+    pool = multiprocessing.Pool(workers)
+    try:
+        for prv in prvs:
+            prv._pool = pool
+        running = [(i, prvs[i].steps()) for i in range(0, len(prvs))]
+        while running:
+            for item in list(running):
+                try:
+                    leaves = next(item[1])
+                except StopIteration:
+                    running.remove(item)
+                    continue
+                yield item[0], leaves
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        for prv in prvs:
+            prv._pool = None
+        pool.join()
+
+
+class LmsBuildState(object):
+    """
+    The progress of the computation of an LMS tree, so that it can be
+    continued after the program stops.  The roots are the subtrees that
+    are done, and the store and the captured nodes are the nodes that
+    the LmsPrivateKey keeps.  The save function, if any, is called when
+    interval more leaves are done and when the tree is done.
+    """
+    def __init__(self, lms_type, lmots_type, I=None, SEED=None,
+                 roots=None, store=None, captured=None):
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        self.lms_type = lms_type
+        self.lmots_type = lmots_type
+        if I is None:
+            I = randBytes(LenI)
+        if SEED is None:
+            SEED = randBytes(n)
+        self.I = I
+        self.SEED = SEED
+        self.roots = {}
+        if roots is not None:
+            self.roots = LmsBuildState.outer(roots)
+        self.store = store
+        if captured is None:
+            captured = {}
+        self.captured = captured
+        self.interval = None
+        self.save = None
+        self._saved = self.leaves()
+
+    @staticmethod
+    def outer(roots):
+        """
+        Drop the subtrees that are inside another one
+        :param roots: a dict of node numbers and values
+        :return: the dict without the inner subtrees
+        """
+        rv = {}
+        for r in roots:
+            a = r >> 1
+            while a and a not in roots:
+                a >>= 1
+            if not a:
+                rv[r] = roots[r]
+        return rv
+
+    @property
+    def done(self):
+        return 1 in self.roots
+
+    def serialize(self, store=True):
+        """
+        LMS type + LMOTS type + SEED + I
+        number of roots - 4 bytes, [node number + node] for each root
+        number of captured nodes - 4 bytes, [node number + node] for each
+        number of stored nodes - 4 bytes, [nodes in the LmsNodeStore layout]
+        :param store: False leaves out the stored nodes, which are then
+            saved in another way or computed again
+        """
+        rv = [self.lms_type + self.lmots_type + self.SEED + self.I]
+        for nodes in (self.roots, self.captured):
+            rv.append(u32(len(nodes)))
+            for r in sorted(nodes):
+                rv.append(u32(r) + nodes[r])
+        store = self.store if store else None
+        if store is None:
+            rv.append(u32(0))
+        else:
+            rv.append(u32(store.count))
+            rv.append(bytes(store.buffer[store.offset:store.offset +
+                                         (store.count*store.m)]))
+        return toBytes('').join(rv)
+
+    @classmethod
+    def deserialize(cls, buffer, pos=0):
+        """
+        Parse a build state
+        :param buffer: the buffer with the state at pos
+        :param pos: the offset of the state in the buffer
+        :return: the LmsBuildState and the offset after it
+        """
+        _need_length(buffer, pos + 8)
+        lms_type = buffer[pos:pos+4]
+        lmots_type = buffer[pos+4:pos+8]
+        if lmots_type not in lmots_params:
+            raise ValueError(err_unknown_typecode, toHex(lmots_type))
+        if lms_type not in lms_params:
+            raise ValueError(err_unknown_typecode, toHex(lms_type))
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        alg2, m, h = lms_params[lms_type]
+        SEED = buffer[pos+8:pos+8+n]
+        I = buffer[pos+8+n:pos+8+n+LenI]
+        pos += 8 + n + LenI
+        lists = []
+        for j in range(0, 2):
+            _need_length(buffer, pos + 4)
+            nodes = {}
+            number = int32(buffer[pos:pos+4])
+            _need_length(buffer, pos + 4 + (number*(4+m)))
+            for k in range(0, number):
+                start = pos + 4 + (k*(4+m))
+                nodes[int32(buffer[start:start+4])] = \
+                    buffer[start+4:start+4+m]
+            pos += 4 + (number*(4+m))
+            lists.append(nodes)
+        _need_length(buffer, pos + 4)
+        size = int32(buffer[pos:pos+4])
+        _need_length(buffer, pos + 4 + (size*m))
+        store = None
+        if size:
+            store = LmsNodeStore(lms_type,
+                                 bytearray(buffer[pos+4:pos+4+(size*m)]),
+                                 count=size)
+        pos += 4 + (size*m)
+        return cls(lms_type, lmots_type, I, SEED, lists[0], store,
+                   lists[1]), pos
+
+    def leaves(self):
+        """
+        The number of leaves below the subtrees that are done
+        """
+        alg2, m, h = lms_params[self.lms_type]
+        return _subtree_leaves(h, self.roots)
+
+    def update(self, roots):
+        """
+        Record the subtrees that are done, and save the state if it is
+        time to
+        :param roots: a dict of node numbers and values
+        """
+        self.roots = LmsBuildState.outer(roots)
+        if self.save is None:
+            return
+        leaves = self.leaves()
+        if self.done or (self.interval and
+                         leaves - self._saved >= self.interval):
+            self._saved = leaves
+            self.save()
+
+
 class LmsPrivateKey(object):
     """
     N-Time Leighton-Micali Signature (LMS) Private Key
     """
     def __init__(self, lms_type=lms_sha256_m32_h5,
-                 lmots_type=lmots_sha256_n32_w8, SEED=None, I=None, q=0):
+                 lmots_type=lmots_sha256_n32_w8, SEED=None, I=None, q=0,
+                 cache_levels=None, workers=None, nodes=None, sink=None,
+                 state=None, build=True):
         if lmots_type not in lmots_params:
             raise ValueError(err_unknown_typecode, toHex(lmots_type))
         if lms_type not in lms_params:
@@ -606,35 +1388,215 @@ class LmsPrivateKey(object):
             if len(SEED) != n:
                 raise ValueError(err_bad_length, str(len(SEED)))
             self.SEED = SEED 
-        self.ots_priv = []
-        self.ots_pub = []
-        self._nodes = {}
-        for j in range(0, 2**h):
-            priv = LmotsPrivateKey(I=self.I, q=u32(j), SEED=self.SEED, lmots_type=lmots_type)
-            pub = priv.publicKey()
-            self.ots_priv.append(priv)
-            self.ots_pub.append(pub)
-        self.pub = self._T(1)
+        self._nodes = None
         self.q = q
+        # With cache_levels=None the whole tree is kept.  Otherwise only
+        # the top cache_levels levels below the root are kept, and the
+        # authentication paths for the levels below them are computed
+        # as the leaves are used.
+        if cache_levels is not None:
+            if cache_levels < 0:
+                raise ValueError(err_bad_value, str(cache_levels))
+            if cache_levels >= h:
+                cache_levels = None
+        self.cache_levels = cache_levels
+        self.workers = workers
+        self._traversal = None
+        self.checkpoints = None
+        # the pool of _tree_steps(), when it computes this tree
+        self._pool = None
+        # With build=False the tree is computed by running steps()
+        self.pub = None
+        self._steps = self._buildSteps(q, nodes, sink, state)
+        if build:
+            for leaves in self._steps:
+                pass
+
+    def steps(self):
+        """
+        The steps of the computation of the tree, for a key made with
+        build=False.  Each step computes one leaf, or one subtree when
+        there are workers.
+        :return: a generator of the number of leaves that are done
+            after each step; the public key is set when it ends
+        """
+        return self._steps
 
-    # Computes the root and other nodes
+    def warm(self):
+        """
+        Compute the tree of a key that was made with build=False.  Does
+        nothing when the tree is already computed.
+        """
+        for leaves in self._steps:
+            pass
+
+    def setNodes(self, nodes=None, sink=None):
+        """
+        Give the nodes of a key that was made with build=False, such as
+        from a sidecar file, before its tree is computed
+        :param nodes: the verified nodes of the tree, or None
+        :param sink: a store that collects the nodes, or None
+        """
+        if self.pub is not None:
+            raise ValueError(err_bad_value, 'nodes')
+        self._steps = self._buildSteps(self.q, nodes, sink)
+
+    # Computes the root with a treehash over the leaves in order, so at
+    # most h+1 pending nodes are held and there is no recursion.  Only
+    # the nodes that the authentication paths need are kept.  When the
+    # nodes are given, such as from a sidecar file, nothing is computed;
+    # when a sink is given, every node is also stored in it.  When a
+    # build state is given, the subtrees that it has are not computed
+    # again, and the progress is recorded in it.
     #
-    def _T(self, r):
+    def _buildSteps(self, q, nodes=None, sink=None, state=None):
         alg2, m, h = lms_params[self.lms_type]
-        if (r >= 2**h):
-            self._nodes[r] = H(alg2, self.I + u32(r) + D_LEAF + \
-                               self.ots_pub[r-(2**h)].K, m)
+        if self.cache_levels is None:
+            levels = 0
+            top = 2**(h+1)
+        else:
+            levels = h - self.cache_levels
+            top = 2**(self.cache_levels+1)
+        wanted = set()
+        if q < 2**h:
+            for t in range(0, levels):
+                wanted.add(LmsTraversal.authNode(h, q, t))
+                wanted.add(LmsTraversal.nextNode(h, q, t))
+        captured = {}
+        if self.cache_levels is None and nodes is not None:
+            self._nodes = nodes
+        elif state is not None and state.store is not None:
+            if state.store.count != top:
+                raise ValueError(err_bad_value, str(state.store.count))
+            self._nodes = state.store
+        elif self.cache_levels is None and sink is not None:
+            self._nodes = sink
         else:
-            self._nodes[r] = H(alg2, self.I + u32(r) + D_INTR + \
-                               self._T(2*r) + self._T((2*r)+1), m)
-        return self._nodes[r] 
+            self._nodes = LmsNodeStore(self.lms_type, count=top)
+        if state is not None:
+            state.store = self._nodes
+            captured = state.captured
+        if nodes is not None:
+            if self.cache_levels is not None:
+                for r in range(1, top):
+                    self._nodes[r] = nodes[r]
+                for r in wanted:
+                    if r is not None:
+                        captured[r] = nodes[r]
+            root = nodes[1]
+        else:
+            def observer(r, value):
+                if r < top:
+                    self._nodes[r] = value
+                elif r in wanted:
+                    captured[r] = value
+                if sink is not None and self._nodes is not sink:
+                    sink[r] = value
+            if self.workers is not None and self.workers > 1:
+                result = {}
+                kept = top
+                if sink is not None:
+                    kept = 2**(h+1)
+                for leaves in self._buildSubtrees(kept, wanted, observer,
+                                                  state, result):
+                    yield leaves
+                root = result[1]
+            else:
+                roots = None
+                if state is not None:
+                    roots = state.roots
+                th = LmsTreehash(self.lms_type, self.lmots_type, self.I,
+                                 self.SEED, 1, observer=observer,
+                                 roots=roots)
+                while not th.done:
+                    th.update()
+                    roots = th.roots()
+                    if state is not None:
+                        state.update(roots)
+                    yield _subtree_leaves(h, roots)
+                root = th.node
+        if levels and q < 2**h:
+            self._traversal = LmsTraversal(self.lms_type, self.lmots_type,
+                                           self.I, self.SEED, q, levels,
+                                           captured)
+        self.pub = root
+
+    # Splits the leaves into subtrees that are computed in a pool of
+    # worker processes, and then computes the levels above them.  The
+    # subtrees that the build state has are skipped or finished.  The
+    # number of leaves that are done is given after each subtree, and
+    # the nodes above the subtrees are put in result.
+    #
+    def _buildSubtrees(self, top, wanted, observer, state, result):
+        alg2, m, h = lms_params[self.lms_type]
+        k = 0
+        while (2**k) < 4*self.workers and k < h:
+            k += 1
+        roots = {}
+        if state is not None:
+            roots = dict(state.roots)
+        tasks = []
+        for r in range(2**k, 2**(k+1)):
+            a = r
+            while a and a not in roots:
+                a >>= 1
+            if a:
+                continue
+            below = dict([(s, roots[s]) for s in roots if s > r and
+                          (s >> (s.bit_length() - r.bit_length())) == r])
+            tasks.append((self.lms_type, self.lmots_type, self.I, self.SEED,
+                          r, top, wanted, below))
+        nodes = result
+        nodes.update(roots)
+        if tasks:
+            # a pool of _tree_steps() is closed by it
+            pool = self._pool
+            own = pool is None
+            if own:
+                pool = multiprocessing.Pool(self.workers)
+            try:
+                for r, value, kept in pool.imap_unordered(_lms_subtree,
+                                                          tasks):
+                    nodes[r] = value
+                    for node_num in kept:
+                        observer(node_num, kept[node_num])
+                    roots[r] = value
+                    roots = LmsBuildState.outer(roots)
+                    if state is not None:
+                        state.update(roots)
+                    yield _subtree_leaves(h, roots)
+                if own:
+                    pool.close()
+            except BaseException:
+                if own:
+                    pool.terminate()
+                raise
+            finally:
+                if own:
+                    pool.join()
+        for r in range((2**k)-1, 0, -1):
+            if r in nodes or (2*r) not in nodes or (2*r)+1 not in nodes:
+                continue
+            nodes[r] = H(alg2, self.I + u32(r) + D_INTR + \
+                         nodes[2*r] + nodes[(2*r)+1], m)
+            observer(r, nodes[r])
+        if state is not None:
+            state.update({1: nodes[1]})
+
+    # Derives the LM-OTS private key for leaf j from I and SEED; the
+    # one-time keys are not kept, they are derived again when needed
+    #
+    def otsPrivateKey(self, j):
+        return LmotsPrivateKey(I=self.I, q=u32(j), SEED=self.SEED,
+                               lmots_type=self.lmots_type)
 
-    def serialize(self):
+    def serialize(self, reserved=0):
         return self.lms_type + self.lmots_type + self.SEED + \
-               self.I + u32(self.q)
+               self.I + u32(self.q + reserved)
 
     @classmethod
-    def deserialize(cls, buffer):
+    def deserialize(cls, buffer, cache_levels=None, workers=None,
+                    nodes=None, sink=None, build=True):
         lms_type = buffer[0:4]
         lmots_type = buffer[4:8]
         if lmots_type not in lmots_params:
@@ -648,10 +1610,18 @@ class LmsPrivateKey(object):
         SEED = buffer[8:8+n]
         I = buffer[8+n:8+n+LenI]
         q = int32(buffer[8+n+LenI:8+n+LenI+LenQ])
-        return cls(lms_type, lmots_type, SEED, I, q)
+        return cls(lms_type, lmots_type, SEED, I, q,
+                   cache_levels=cache_levels, workers=workers,
+                   nodes=nodes, sink=sink, build=build)
 
     def path(self, node_num):
         p = []
+        if self._traversal is not None:
+            alg2, m, h = lms_params[self.lms_type]
+            if node_num != self.q + (2**h):
+                raise ValueError(err_bad_value, str(node_num))
+            p = self._traversal.path()
+            node_num = node_num >> self._traversal.levels
         while node_num > 1:
             if (node_num % 2):
                 p.append(self._nodes[node_num-1])
@@ -661,16 +1631,16 @@ class LmsPrivateKey(object):
         return p
         
     def sign(self, message):
-        alg, m, h = lms_params[self.lms_type]
-        if (self.q >= 2**h):
-            raise ValueError(err_private_key_exhausted)
-        ots_sig = self.ots_priv[self.q].sign(message)
-        p = self.path(self.q + 2**h)
-        leaf_num = self.q
-        self.q += 1
-        return u32(leaf_num) + ots_sig + self.lms_type + serialize_list(p)
+        signer = self.signer()
+        signer.update(message)
+        return signer.finalize()
+
+    def signer(self):
+        self.warm()
+        return LmsSigner(self)
         
     def publicKey(self):
+        self.warm()
         return LmsPublicKey(self.I, self.pub, self.lms_type, self.lmots_type)
 
     def remaining(self):
@@ -691,7 +1661,7 @@ class LmsPrivateKey(object):
         rv += ("   I         : %s\n" % toHex(self.I))
         rv += ("   SEED      : %s\n" % toHex(self.SEED))
         rv += ("   q         : %s\n" % toHex(u32(self.q)))
-        rv += ("   pub       : %s\n" % toHex(self.pub))
+        rv += ("   pub       : %s\n" % _pubHex(self.pub))
         rv += ("   max signs : %d\n" % self.maxSignatures())
         return rv
 
@@ -707,27 +1677,12 @@ class LmsPublicKey(object):
         self.lmots_type = lmots_type
 
     def verify(self, message, sig):
-        alg2, m, h = lms_params[self.lms_type]
-        alg, n, p, w, ls = lmots_params[self.lmots_type]
-        if (alg != alg2):
-            raise ValueError(err_algorithm_mismatch, alg + ' and ' + alg2)
-        lms_sig = LmsSignature.deserialize(sig)
-        if lms_sig.type != self.lms_type:
-            return False
-        if len(lms_sig.path) != h:
-            return False
-        if lms_sig.q > 2**h:
-            return False
-        Kc = lms_sig.lmots_sig.buildPublic(self.I, u32(lms_sig.q), message)
-        node_num = lms_sig.q + (2**h)
-        tmp = H(alg, self.I + u32(node_num) + D_LEAF + Kc, m)
-        for pv in lms_sig.path:
-            if (node_num % 2):
-                 tmp = H(alg, self.I + u32(node_num//2) + D_INTR + pv + tmp, m)
-            else:
-                 tmp = H(alg, self.I + u32(node_num//2) + D_INTR + tmp + pv, m)
-            node_num = node_num//2
-        return bool(tmp == self.K)
+        verifier = self.verifier(sig)
+        verifier.update(message)
+        return verifier.finalize()
+
+    def verifier(self, sig):
+        return LmsVerifier(self, sig)
 
     def serialize(self):
         return self.lms_type + self.lmots_type + self.I + self.K
@@ -779,6 +1734,256 @@ class LmsPublicKey(object):
         return rv
 
 
+def _pubHex(pub):
+    # The root of a tree that was not computed yet is not known
+    if pub is None:
+        return "(not computed)"
+    return toHex(pub)
+
+
+def lms_signature_length(lms_type, lmots_type):
+    """
+    The length of an LMS signature
+    :param lms_type: the LMS type of the tree
+    :param lmots_type: the LM-OTS type of the tree
+    :return: the length in bytes
+    """
+    alg, n, p, w, ls = lmots_params[lmots_type]
+    alg2, m, h = lms_params[lms_type]
+    return 4 + (4 + n + (p*n)) + 4 + (h*m)
+
+
+class LmsSigner(object):
+    """
+    Incremental LMS signature with an interface similar to hashlib.
+
+    The leaf, its authentication path, and the randomizer C are taken
+    when the signer is created, so the message is hashed as it is
+    given to update().  The signature is made by finalize().
+    """
+    def __init__(self, prv):
+        alg2, m, h = lms_params[prv.lms_type]
+        if (prv.q >= 2**h):
+            raise ValueError(err_private_key_exhausted)
+        alg, n, p, w, ls = lmots_params[prv.lmots_type]
+        self.lms_type = prv.lms_type
+        self.q = prv.q
+        self.n = n
+        self.size = lms_signature_length(prv.lms_type, prv.lmots_type)
+        self.path = prv.path(prv.q + 2**h)
+        self.ots_prv = prv.otsPrivateKey(prv.q)
+        prv.q += 1
+        if prv.checkpoints is not None:
+            self.ots_prv.checkpoints = prv.checkpoints.take(self.q)
+        if prv._traversal is not None:
+            prv._traversal.advance(self.q)
+        self.C = randBytes(n)
+        self._hash = H_start(alg)
+        H_update(self._hash, prv.I + u32(self.q) + D_MESG + self.C)
+
+    def update(self, buf):
+        if self._hash is None:
+            raise ValueError(err_finalized)
+        H_update(self._hash, buf)
+
+    def finalize(self):
+        if self._hash is None:
+            raise ValueError(err_finalized)
+        hash1 = H_finish(self._hash, self.n)
+        self._hash = None
+        ots_sig = self.ots_prv.signDigest(self.C, hash1)
+        return u32(self.q) + ots_sig + self.lms_type + \
+               serialize_list(self.path)
+
+    def finalizeInto(self, out, offset=0):
+        """
+        Make the signature like finalize(), writing it into out
+        :param out: a bytearray or writable memoryview with room for
+            size bytes at offset
+        :param offset: where the signature starts in out
+        :return: the offset after the signature
+        """
+        if self._hash is None:
+            raise ValueError(err_finalized)
+        if len(out) - offset < self.size:
+            raise ValueError(err_bad_length, str(len(out) - offset))
+        hash1 = H_finish(self._hash, self.n)
+        self._hash = None
+        out[offset:offset+4] = u32(self.q)
+        pos = self.ots_prv.signDigestInto(self.C, hash1, out, offset + 4)
+        out[pos:pos+4] = self.lms_type
+        pos += 4
+        for node in self.path:
+            out[pos:pos+len(node)] = node
+            pos += len(node)
+        return pos
+
+
+class LmsVerifier(object):
+    """
+    Incremental LMS signature verification with an interface similar
+    to hashlib.  The message is hashed as it is given to update(), and
+    finalize() returns True if the signature is valid.  The signature
+    is a buffer or an LmsSignatureView; it is not copied.
+    """
+    def __init__(self, pub, sig):
+        alg2, m, h = lms_params[pub.lms_type]
+        alg, n, p, w, ls = lmots_params[pub.lmots_type]
+        if (alg != alg2):
+            raise ValueError(err_algorithm_mismatch, alg + ' and ' + alg2)
+        self.pub = pub
+        if not isinstance(sig, LmsSignatureView):
+            sig = LmsSignatureView(sig)
+        self.lms_sig = sig
+        self.valid = (sig.lms_type == pub.lms_type)
+        alg, n, p, w, ls = lmots_params[sig.lmots_type]
+        self.n = n
+        self._hash = H_start(alg)
+        H_update(self._hash, pub.I + u32(sig.q) + D_MESG)
+        H_update(self._hash, sig.C())
+
+    def update(self, buf):
+        if self._hash is None:
+            raise ValueError(err_finalized)
+        H_update(self._hash, buf)
+
+    def finalize(self):
+        if self._hash is None:
+            raise ValueError(err_finalized)
+        hash1 = H_finish(self._hash, self.n)
+        self._hash = None
+        if not self.valid:
+            return False
+        pub = self.pub
+        lms_sig = self.lms_sig
+        alg, m, h = lms_params[pub.lms_type]
+        alg, n, p, w, ls = lmots_params[lms_sig.lmots_type]
+        digits = lmots_codec(lms_sig.lmots_type).digits(hash1)
+        chain = LmotsChain(lms_sig.lmots_type, pub.I, u32(lms_sig.q))
+        top = chain.top
+        Kc = chain.publicKey([chain.run(i, lms_sig.y(i).tobytes(), a, top)
+                              for i, a in enumerate(digits)])
+        node_num = lms_sig.q + (2**h)
+        tmp = H(alg, pub.I + u32(node_num) + D_LEAF + Kc, m)
+        for i in range(0, h):
+            # the path node is hashed from the buffer, without a copy
+            pv = lms_sig.path(i)
+            hash = H_start(alg)
+            H_update(hash, pub.I + u32(node_num//2) + D_INTR)
+            if (node_num % 2):
+                 H_update(hash, pv)
+                 H_update(hash, tmp)
+            else:
+                 H_update(hash, tmp)
+                 H_update(hash, pv)
+            tmp = H_finish(hash, m)
+            node_num = node_num//2
+        return bool(tmp == pub.K)
+
+
+class LmsCheckpointCache(object):
+    """
+    LmotsCheckpoints for the next leaves of an LMS private key.  The
+    checkpoints are computed by fill(), which may be called when the
+    program is idle, or by a background thread.  The checkpoints of a
+    leaf are zeroed when the leaf is used, and all of them by close().
+    The interval is the number of chain steps between the checkpoints;
+    None uses LmotsCheckpoints.defaultInterval().
+    """
+    def __init__(self, prv, leaves, interval=None, background=False):
+        if leaves < 1:
+            raise ValueError(err_bad_value, str(leaves))
+        if interval is None:
+            interval = LmotsCheckpoints.defaultInterval(prv.lmots_type)
+        self.prv = prv
+        self.leaves = leaves
+        self.interval = interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = None
+        prv.checkpoints = self
+        if background:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _next(self):
+        # The next leaf that has no checkpoints, or None
+        alg2, m, h = lms_params[self.prv.lms_type]
+        end = min(self.prv.q + self.leaves, 2**h)
+        for q in range(self.prv.q, end):
+            if q not in self._entries:
+                return q
+        return None
+
+    def fill(self, limit=None):
+        """
+        Compute the checkpoints of the next leaves that have none
+        :param limit: the most leaves to compute; None for all
+        :return: the number of leaves that were computed
+        """
+        done = 0
+        while limit is None or done < limit:
+            with self._lock:
+                if self._closed:
+                    break
+                q = self._next()
+            if q is None:
+                break
+            prv = self.prv
+            checkpoints = LmotsCheckpoints(prv.lmots_type, prv.I, u32(q),
+                                           prv.SEED, self.interval)
+            with self._lock:
+                if self._closed or q < prv.q:
+                    checkpoints.wipe()
+                else:
+                    self._entries[q] = checkpoints
+            done += 1
+        return done
+
+    def take(self, q):
+        """
+        Remove the checkpoints of leaf q, and the ones of earlier leaves
+        :return: the LmotsCheckpoints, or None if they are not computed
+        """
+        with self._lock:
+            for old in [k for k in self._entries if k < q]:
+                self._entries.pop(old).wipe()
+            checkpoints = self._entries.pop(q, None)
+            self._wake.notify()
+        return checkpoints
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed and self._next() is None:
+                    self._wake.wait()
+                if self._closed:
+                    return
+            self.fill(1)
+
+    def close(self):
+        """
+        Stop the background thread and zero all of the checkpoints
+        """
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+            for checkpoints in self._entries.values():
+                checkpoints.wipe()
+            self._entries = {}
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.prv.checkpoints is self:
+            self.prv.checkpoints = None
+
+
 # ----------------------------------------------------------------------
 # The Hierarchical Signature System (HSS)
 # ----------------------------------------------------------------------
@@ -864,26 +2069,343 @@ class HssSignature():
         return rv
 
 
-class HssPrivateKey(object):
+class HssSignatureView(object):
     """
-    Hierarchical Signature System (HSS) Private Key
+    The offsets of the signed public keys and the LMS signatures within
+    a HSS signature buffer.  The buffer is not copied; bytes, bytearray,
+    mmap, and memoryview are accepted.
     """
-    def __init__(self, levels=2, lms_type=lms_sha256_m32_h5,
-                 lmots_type=lmots_sha256_n32_w8, SEED=None,
-                 remaining_signatures=None, prvs=None, sigs=None):
-        if levels < 1 or levels > MaxHssLevels:
-            ValueError(err_bad_number_of_levels, str(levels))
+    def __init__(self, buffer):
+        if not isinstance(buffer, memoryview):
+            buffer = memoryview(buffer)
+        if len(buffer) < 4:
+            raise ValueError(err_bad_length, str(len(buffer)))
+        self.buffer = buffer
+        self.levels = int32(buffer[0:4].tobytes()) + 1
+        if self.levels < 1 or self.levels > MaxHssLevels:
+            raise ValueError(err_bad_number_of_levels, str(self.levels))
+        self.sig = []
+        self.pub_pos = []
+        pos = 4
+        for i in range(0, self.levels-1):
+            lms_sig = LmsSignatureView(buffer, pos, exact=False)
+            self.sig.append(lms_sig)
+            pos = lms_sig.end
+            if len(buffer) < pos+8:
+                raise ValueError(err_bad_length, str(len(buffer)))
+            lms_type = buffer[pos:pos+4].tobytes()
+            if lms_type not in lms_params:
+                raise ValueError(err_unknown_typecode, toHex(lms_type))
+            alg2, m, h = lms_params[lms_type]
+            end = pos+8+LenI+m
+            if len(buffer) < end:
+                raise ValueError(err_bad_length, str(len(buffer)))
+            self.pub_pos.append((pos, end))
+            pos = end
+        self.lms_sig = LmsSignatureView(buffer, pos)
+
+    def pubBuffer(self, i):
+        """
+        The signed public key of level i+1, as it appears in the buffer
+        """
+        start, end = self.pub_pos[i]
+        return self.buffer[start:end]
+
+    def pub(self, i):
+        return LmsPublicKey.deserialize(self.pubBuffer(i).tobytes())
+
+
+def hss_params(levels, lms_type, lmots_type, params=None):
+    """
+    The LMS and LM-OTS types of each level of a HSS private key
+    :param levels: the number of levels
+    :param lms_type: the LMS type of every level
+    :param lmots_type: the LM-OTS type of every level
+    :param params: a list of (lms_type, lmots_type) for each level,
+        which is used instead of the other arguments when it is given
+    :return: a list of (lms_type, lmots_type) for each level
+    """
+    if params is None:
+        params = [(lms_type, lmots_type)]*levels
+    params = [(lms_type, lmots_type) for lms_type, lmots_type in params]
+    if len(params) < 1 or len(params) > MaxHssLevels:
+        raise ValueError(err_bad_number_of_levels, str(len(params)))
+    # the trees can differ in height and w, but not in hash or size,
+    # as the SEED of the key is given to the trees that replace them
+    first = None
+    for lms_type, lmots_type in params:
         if lmots_type not in lmots_params:
             raise ValueError(err_unknown_typecode, toHex(lmots_type))
         if lms_type not in lms_params:
             raise ValueError(err_unknown_typecode, toHex(lms_type))
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        alg2, m, h = lms_params[lms_type]
+        if (alg != alg2) or (first is not None and first != (alg, n, m)):
+            raise ValueError(err_algorithm_mismatch, alg + ' and ' + alg2)
+        first = (alg, n, m)
+    return params
+
+
+class HssKeygenProgress(object):
+    """
+    Progress of the computation of the trees of a new HSS private key:
+    the trees and leaves that are done, the hashes computed, the rate,
+    and the time left.  The hashes are estimated from the leaves, as
+    each leaf takes p*2^w hashes for its LM-OTS key and about three
+    more for the tree.  Leaves that were done before a resume do not
+    count in the hashes or the rate.
+    """
+    def __init__(self, params):
+        self.levels = len(params)
+        self.levels_done = 0
+        self.leaves = 0
+        self.total = 0
+        for lms_type, lmots_type in params:
+            alg2, m, h = lms_params[lms_type]
+            self.total += 2**h
+        self.computed = 0
+        self.hashes = 0
+        self.start = time.time()
+
+    @staticmethod
+    def leafHashes(lmots_type):
+        """
+        The estimated number of hashes for one leaf
+        """
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        return (p*(2**w)) + 3
+
+    @property
+    def done(self):
+        return self.levels_done == self.levels
+
+    def elapsed(self):
+        """
+        The seconds since the computation started
+        """
+        return time.time() - self.start
+
+    def rate(self):
+        """
+        The leaves computed per second
+        """
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.0
+        return self.computed / elapsed
+
+    def eta(self):
+        """
+        The estimated seconds left, or None before any leaf is computed
+        """
+        rate = self.rate()
+        if rate <= 0:
+            return None
+        return (self.total - self.leaves) / rate
+
+
+class HssKeygen(object):
+    """
+    Computes the trees of a new HSS private key a step at a time, so
+    that the caller can report the progress or do other work between
+    the steps, such as from a generator:
+
+        keygen = HssKeygen(levels=2)
+        for progress in keygen.steps():
+            print(progress.leaves, progress.total)
+        hss_prv = keygen.key
+
+    Each step computes one leaf, or one subtree when there are workers.
+    With workers, the trees of all levels are computed at the same time
+    in one pool, and each level signs the public key of the level below
+    it once they are done.  The genkey state, if any, is where the trees
+    continue from and where their progress is recorded.
+    """
+    def __init__(self, levels=2, lms_type=lms_sha256_m32_h5,
+                 lmots_type=lmots_sha256_n32_w8, SEED=None,
+                 cache_levels=None, workers=None, state=None, params=None):
+        self.params = hss_params(levels, lms_type, lmots_type, params)
+        self.levels = len(self.params)
+        self.lms_type, self.lmots_type = self.params[0]
+        self.SEED = SEED
+        self.cache_levels = cache_levels
+        self.workers = workers
+        self.state = state
+        self.prvs = []
+        self.sigs = []
+        self.progress = HssKeygenProgress(self.params)
+        self._key = None
+        self._tree = None
+        self._steps = None
+        self._skipped = 0
+        self._done = (0, 0, 0)
+        # with workers, the trees of all levels, and the leaves done and
+        # skipped in each of them
+        self._trees = None
+        self._counts = None
+
+    @property
+    def done(self):
+        return len(self.prvs) == self.levels
+
+    @property
+    def key(self):
+        """
+        The HssPrivateKey, once every tree is done
+        """
+        if not self.done:
+            return None
+        if self._key is None:
+            self._key = HssPrivateKey(self.levels, params=self.params,
+                                      prvs=list(self.prvs),
+                                      sigs=list(self.sigs),
+                                      cache_levels=self.cache_levels,
+                                      workers=self.workers)
+        return self._key
+
+    def _newTree(self, level):
+        lms_type, lmots_type = self.params[level]
+        if self.state is None:
+            prv = LmsPrivateKey(lms_type=lms_type, lmots_type=lmots_type,
+                                SEED=self.SEED,
+                                cache_levels=self.cache_levels,
+                                workers=self.workers, build=False)
+            self._skipped = 0
+        else:
+            tree = self.state.tree(level)
+            prv = LmsPrivateKey(lms_type=lms_type, lmots_type=lmots_type,
+                                SEED=tree.SEED,
+                                I=tree.I, cache_levels=self.cache_levels,
+                                workers=self.workers, state=tree,
+                                build=False)
+            self._skipped = tree.leaves()
+        return prv
+
+    def step(self):
+        """
+        Do the next step of the computation
+        :return: the HssKeygenProgress
+        """
+        if self.done:
+            return self.progress
+        if self.workers is not None and self.workers > 1 and \
+           self.levels > 1:
+            return self._stepLevels()
+        progress = self.progress
+        if self._tree is None:
+            self._tree = self._newTree(len(self.prvs))
+            self._steps = self._tree.steps()
+        # the leaves, computed leaves and hashes of the trees that are done
+        leaves, computed, hashes = self._done
+        try:
+            done = next(self._steps)
+            count = max(0, done - self._skipped)
+            progress.leaves = leaves + done
+            progress.computed = computed + count
+            progress.hashes = hashes + \
+                (count*HssKeygenProgress.leafHashes(self._tree.lmots_type))
+            return progress
+        except StopIteration:
+            pass
+        prv = self._tree
+        self._tree = None
+        self._steps = None
+        if self.prvs:
+            self.sigs.append(self.prvs[-1].sign(prv.publicKey().serialize()))
+        self.prvs.append(prv)
+        alg2, m, h = lms_params[prv.lms_type]
+        progress.levels_done = len(self.prvs)
+        progress.leaves = leaves + (2**h)
+        self._done = (progress.leaves, progress.computed, progress.hashes)
+        return progress
+
+    def _stepLevels(self):
+        # Does the next step of the trees of all levels
+        progress = self.progress
+        if self._trees is None:
+            self._trees = []
+            self._counts = []
+            for level in range(0, self.levels):
+                self._trees.append(self._newTree(level))
+                self._counts.append([0, self._skipped])
+            self._steps = _tree_steps(self._trees, self.workers)
+        try:
+            i, done = next(self._steps)
+            self._counts[i][0] = done
+        except StopIteration:
+            for i in range(1, self.levels):
+                pub = self._trees[i].publicKey()
+                self.sigs.append(self._trees[i-1].sign(pub.serialize()))
+            self.prvs = self._trees
+            self._trees = None
+            self._steps = None
+            for i in range(0, self.levels):
+                alg2, m, h = lms_params[self.prvs[i].lms_type]
+                self._counts[i][0] = 2**h
+        progress.leaves = 0
+        progress.computed = 0
+        progress.hashes = 0
+        progress.levels_done = 0
+        for i in range(0, self.levels):
+            lms_type, lmots_type = self.params[i]
+            alg2, m, h = lms_params[lms_type]
+            done, skipped = self._counts[i]
+            count = max(0, done - skipped)
+            progress.leaves += done
+            progress.computed += count
+            progress.hashes += count*HssKeygenProgress.leafHashes(lmots_type)
+            if done == 2**h:
+                progress.levels_done += 1
+        return progress
+
+    def steps(self):
+        """
+        A generator of the steps of the computation
+        :return: the HssKeygenProgress after each step
+        """
+        while not self.done:
+            yield self.step()
+
+    def run(self):
+        """
+        Do every step of the computation
+        :return: the HssPrivateKey
+        """
+        for progress in self.steps():
+            pass
+        return self.key
+
+
+class HssPrivateKey(object):
+    """
+    Hierarchical Signature System (HSS) Private Key
+    """
+    def __init__(self, levels=2, lms_type=lms_sha256_m32_h5,
+                 lmots_type=lmots_sha256_n32_w8, SEED=None,
+                 remaining_signatures=None, prvs=None, sigs=None,
+                 cache_levels=None, workers=None, keygen=None, params=None,
+                 amortize=False, nexts=None, lazy=False):
+        # the LMS and LM-OTS types of each level
+        self.params = hss_params(levels, lms_type, lmots_type, params)
+        levels = len(self.params)
+        lms_type, lmots_type = self.params[0]
         self.levels = levels
         self.lms_type = lms_type
         self.lmots_type = lmots_type
-        alg2, m, h = lms_params[lms_type]
+        self.cache_levels = cache_levels
+        self.workers = workers
+        # counts the times the trees below the top tree are replaced
+        self.generation = 0
+        # With amortize, the tree that replaces each lower level is
+        # computed a few leaves at a time with each signature; next has
+        # the LmsPrivateKey, its steps, and its LmsBuildState by level
+        self.amortize = amortize
+        self.next = {}
+        # the leaves of the next trees that warm() computes again, by level
+        self._rebuild = {}
+        # the signature prefix and the generation it was made for
+        self._prefix = None
         alg, n, p, w, ls = lmots_params[lmots_type]
-        if (alg != alg2):
-            raise ValueError(err_algorithm_mismatch, alg + ' and ' + alg2)
         if SEED is None:
             self.SEED = randBytes(n)
         else:
@@ -891,50 +2413,224 @@ class HssPrivateKey(object):
                 raise ValueError(err_bad_length, str(len(SEED)))
             self.SEED = SEED
         if prvs is None:
-            prvs = [LmsPrivateKey(lms_type=lms_type,
-                                 lmots_type=lmots_type, SEED=SEED)]
+            builder = HssKeygen(levels, SEED=SEED,
+                                cache_levels=cache_levels, workers=workers,
+                                state=keygen, params=self.params)
+            for progress in builder.steps():
+                pass
+            prvs, sigs = builder.prvs, builder.sigs
         self.prv = prvs
         if remaining_signatures is None:
-            self._signatures_remaining = 2**(levels*h)
+            self._signatures_remaining = self.maxSignatures()
         else:
             self._signatures_remaining = remaining_signatures
-        self.pub = []
-        for i in range(0, len(self.prv)):
-            self.pub.append(prvs[i].publicKey())
         if sigs is None:
             self.sig = []
         else:
             self.sig = sigs
+        # With lazy, the trees of prvs are computed by warm(), or when
+        # they are first needed
+        self.pub = []
+        self._warmed = False
+        # the sidecar that warm() looks up the nodes of prvs in
+        self._aux = None
+        if amortize and nexts:
+            for level in nexts:
+                state = nexts[level]
+                if 0 < level < self.levels and \
+                   (state.lms_type, state.lmots_type) == self.params[level]:
+                    self._startNext(level, state)
+        if not lazy:
+            self.warm()
+
+    def _startNext(self, level, state=None):
+        # Starts the tree that replaces the tree of one level
+        lms_type, lmots_type = self.params[level]
+        if state is None:
+            state = LmsBuildState(lms_type, lmots_type, SEED=self.SEED)
+        elif state.roots:
+            # Without cache_levels the nodes are not saved, so the
+            # subtrees that are done are computed again by warm()
+            alg2, m, h = lms_params[lms_type]
+            top = 2**(h+1)
+            if self.cache_levels is not None and self.cache_levels < h:
+                top = 2**(self.cache_levels+1)
+            if state.store is None or state.store.count != top:
+                self._rebuild[level] = state.leaves()
+                state.roots = {}
+                state.captured = {}
+                state.store = None
+        prv = LmsPrivateKey(lms_type=lms_type, lmots_type=lmots_type,
+                            SEED=state.SEED, I=state.I,
+                            cache_levels=self.cache_levels, state=state,
+                            build=False)
+        self.next[level] = (prv, prv.steps(), state)
+
+    def buildNext(self):
+        """
+        Compute the next leaves of the trees that replace the lower
+        levels.  Each tree gets enough leaves that it is done by the
+        time the tree it replaces is exhausted, so the replacement
+        never has to be computed at once.
+        """
+        if not self.amortize:
+            return
+        # signatures left before the tree of level i is exhausted, and
+        # the signatures for each leaf of level i
+        left = 0
+        below = 1
+        for i in range(self.levels - 1, 0, -1):
+            prv = self.prv[i]
+            alg2, m, h = lms_params[prv.lms_type]
+            left += prv.remaining()*below
+            below *= 2**h
+            if i not in self.next:
+                self._startNext(i)
+            tree, steps, state = self.next[i]
+            alg2, m, h = lms_params[tree.lms_type]
+            todo = (2**h) - state.leaves()
+            if todo <= 0:
+                continue
+            if left > 0:
+                todo = (todo + left - 1) // left
+            for j in range(0, todo):
+                try:
+                    next(steps)
+                except StopIteration:
+                    break
+
+    def warm(self):
+        """
+        Compute the trees of a key that was loaded with lazy, and the
+        trees of the levels that are missing.  Does nothing when they
+        are already computed.
+        """
+        if self._warmed:
+            return
+        # the digests of the sidecar are checked now, not on load
+        if self._aux is not None:
+            for i, prv in enumerate(self.prv):
+                if prv.pub is None:
+                    prv.setNodes(*self._aux.lookup(i, prv.serialize()))
+            self._aux = None
         for i in range(len(self.prv), self.levels):
             self.prv.append(LmsPrivateKey(
-                lms_type=lms_type, lmots_type=lmots_type, SEED=SEED))
-            self.pub.append(self.prv[-1].publicKey())
-            self.sig.append(self.prv[-2].sign(self.pub[-1].serialize()))
+                lms_type=self.params[i][0], lmots_type=self.params[i][1],
+                SEED=self.SEED, cache_levels=self.cache_levels,
+                workers=self.workers, build=False))
+        # with workers, the trees of all levels are computed at once
+        trees = [prv for prv in self.prv if prv.pub is None]
+        if self.workers is not None and self.workers > 1 and len(trees) > 1:
+            for step in _tree_steps(trees, self.workers):
+                pass
+        for prv in self.prv:
+            prv.warm()
+        self.pub = [prv.publicKey() for prv in self.prv]
+        for i in range(len(self.sig) + 1, self.levels):
+            self.sig.append(self.prv[i-1].sign(self.pub[i].serialize()))
+        for level in sorted(self._rebuild):
+            if level in self.next:
+                tree, steps, state = self.next[level]
+                while state.leaves() < self._rebuild[level]:
+                    try:
+                        next(steps)
+                    except StopIteration:
+                        break
+        self._rebuild = {}
+        self._warmed = True
+
+    def nextLeaves(self):
+        """
+        The number of leaves that are done in the trees that replace
+        the lower levels
+        """
+        return sum([self.next[i][2].leaves() for i in self.next])
 
-    def sign(self, message):
+    def refresh(self):
+        """
+        Replace the exhausted trees, so that the bottom tree has a leaf
+        available for the next signature
+        """
         if self._signatures_remaining == 0:
             raise ValueError(err_private_key_exhausted)
+        self.warm()
         # remove exhausted trees
         while (self.prv[-1].is_exhausted()):
             self.prv.pop()
             self.pub.pop()
             self.sig.pop()
         # refresh exhausted trees
+        if len(self.prv) < self.levels:
+            self.generation += 1
         while (len(self.prv) < self.levels):
-            self.prv.append(LmsPrivateKey(lms_type=self.lms_type,
-                                lmots_type=self.lmots_type, SEED=self.SEED))
+            lms_type, lmots_type = self.params[len(self.prv)]
+            if len(self.prv) in self.next:
+                prv, steps, state = self.next.pop(len(self.prv))
+                for leaves in steps:
+                    pass
+                self.prv.append(prv)
+            else:
+                self.prv.append(LmsPrivateKey(lms_type=lms_type,
+                                lmots_type=lmots_type, SEED=self.SEED,
+                                cache_levels=self.cache_levels,
+                                workers=self.workers))
             self.pub.append(self.prv[-1].publicKey())
             self.sig.append(self.prv[-2].sign(self.pub[-1].serialize()))           
-        # sign message
-        self._signatures_remaining += -1
-        msg_sig = self.prv[-1].sign(message)
-        rv = u32(self.levels-1)
-        for i in range(0, self.levels - 1):
-            rv += self.sig[i] + self.pub[i+1].serialize()
-        rv += msg_sig
+
+    def sign(self, message):
+        signer = self.signer()
+        signer.update(message)
+        return signer.finalize()
+
+    def signInto(self, message, out, offset=0):
+        """
+        Sign the message, writing the signature into out
+        :param message: the message
+        :param out: a bytearray or writable memoryview with room for
+            signatureLength() bytes at offset
+        :param offset: where the signature starts in out
+        :return: the number of bytes written
+        """
+        if len(out) - offset < self.signatureLength():
+            raise ValueError(err_bad_length, str(len(out) - offset))
+        signer = self.signer()
+        signer.update(message)
+        return signer.finalizeInto(out, offset)
+
+    def signer(self):
+        return HssSigner(self)
+
+    def signaturePrefix(self):
+        """
+        The part of the signature before the signature of the bottom
+        tree: the number of signed public keys, and the signature and
+        public key of each lower tree.  It only changes when trees are
+        replaced, so it is made once for each generation.
+        """
+        self.warm()
+        if self._prefix is None or self._prefix[0] != self.generation:
+            parts = [u32(self.levels-1)]
+            for i in range(0, self.levels - 1):
+                parts.append(self.sig[i])
+                parts.append(self.pub[i+1].serialize())
+            self._prefix = (self.generation, toBytes('').join(parts))
+        return self._prefix[1]
+
+    def signatureLength(self):
+        """
+        The length of the signatures in bytes
+        """
+        # computed from the types, so the trees are not needed
+        rv = 4
+        for i, (lms_type, lmots_type) in enumerate(self.params):
+            rv += lms_signature_length(lms_type, lmots_type)
+            if i > 0:
+                alg2, m, h = lms_params[lms_type]
+                rv += 8 + LenI + m
         return rv
 
     def publicKey(self):
+        self.warm()
         return HssPublicKey(self.pub[0], self.levels)
 
     def remaining(self):
@@ -944,42 +2640,88 @@ class HssPrivateKey(object):
         return not bool(self._signatures_remaining)
 
     def maxSignatures(self):
-        alg2, m, h = lms_params[self.lms_type]
-        return 2**(self.levels*h)
+        rv = 1
+        for lms_type, lmots_type in self.params:
+            alg2, m, h = lms_params[lms_type]
+            rv *= 2**h
+        return rv
 
-    def serialize(self):        
+    def serialize(self, reserved=0):        
+        # reserved leaves of the bottom tree are recorded as already used
+        bottom = len(self.prv) - 1
         # make sure to maintain 4-byte padding of all 1's to indicate we should use deserializeV2
         rv = u32(self.levels) + fromHex('1'*8)
-        serialized_prv0 = self.prv[0].serialize()
+        serialized_prv0 = self.prv[0].serialize(reserved if bottom == 0 else 0)
         rv += u32(len(serialized_prv0)) + serialized_prv0
 
         # all non-root keys and associated signatures
         for i in range(1, len(self.prv)):
             sig = self.sig[i - 1]
             prv = self.prv[i]
-            serialized_prv = prv.serialize()
+            serialized_prv = prv.serialize(reserved if bottom == i else 0)
             rv += u32(len(sig)) + sig + u32(len(serialized_prv)) + serialized_prv
+
+        # the trees that replace the lower levels follow a length of all
+        # 1's, so they are not taken for another signature and key
+        if self.next:
+            rv += fromHex('f'*8) + u32(len(self.next))
+            # the nodes of a tree without cache_levels are not saved,
+            # since they are the size of the tree
+            store = self.cache_levels is not None
+            for level in sorted(self.next):
+                serialized_state = self.next[level][2].serialize(store)
+                rv += u32(level) + u32(len(serialized_state)) + serialized_state
         return rv
 
+    def qOffset(self, level):
+        """
+        The offset of q for one level in the buffer from serialize().
+        The offsets do not change until the trees are refreshed.
+        :param level: the level in the HSS hierarchy
+        :return: the offset of the 4-byte q
+        """
+        offset = 8
+        for i in range(0, level + 1):
+            if i > 0:
+                offset += 4 + len(self.sig[i - 1])
+            offset += 4 + len(self.prv[i].serialize())
+        return offset - 4
+
     @classmethod
-    def deserialize(cls, buffer):
+    def deserialize(cls, buffer, cache_levels=None, workers=None, aux=None,
+                    amortize=False, lazy=False):
         if len(buffer) < 8:
             raise ValueError(err_bad_length, str(len(buffer)))
         levels = int32(buffer[0:4])
         rs = int32(buffer[4:8])
         if rs == int32(fromHex('1'*8)):
-            return cls.deserializeV2(buffer)
-        prv = LmsPrivateKey.deserialize(buffer[8:])
-        return cls(levels, lms_type=prv.lms_type, lmots_type=prv.lmots_type, \
-                   remaining_signatures=rs, prvs=[prv])
+            return cls.deserializeV2(buffer, cache_levels=cache_levels,
+                                     workers=workers, aux=aux,
+                                     amortize=amortize, lazy=lazy)
+        nodes, sink = None, None
+        if aux is not None and not lazy:
+            nodes, sink = aux.lookup(0, buffer[8:])
+        prv = LmsPrivateKey.deserialize(buffer[8:], cache_levels=cache_levels,
+                                        workers=workers, nodes=nodes, sink=sink,
+                                        build=not lazy)
+        rv = cls(levels, lms_type=prv.lms_type, lmots_type=prv.lmots_type, \
+                 remaining_signatures=rs, prvs=[prv],
+                 cache_levels=cache_levels, workers=workers,
+                 amortize=amortize, lazy=lazy)
+        if lazy:
+            rv._aux = aux
+        return rv
 
     @classmethod
-    def deserializeV2(cls, buffer):
+    def deserializeV2(cls, buffer, cache_levels=None, workers=None, aux=None,
+                      amortize=False, lazy=False):
         """
         levels - 4 bytes
         padding of all ones - 4 bytes
         [root key_length in bytes + root key]
         [signature_length in bytes + signature + key_length in bytes + key]... for each additional level's private key
+        optionally, all ones - 4 bytes + number of next trees - 4 bytes
+        [level + state_length in bytes + LmsBuildState]... for each tree that replaces a lower level
         """
         if len(buffer) < 8:
             raise ValueError(err_bad_length, str(len(buffer)))
@@ -989,34 +2731,75 @@ class HssPrivateKey(object):
         remaining_signatures = 0
         prvs = []
         sigs = []
+        nexts = {}
         read_bytes = 8
         while read_bytes < len(buffer):
             if len(prvs) > 0:
                 # for every key after the root key
                 sig_length = int32(buffer[read_bytes:read_bytes+4])
                 read_bytes += 4
+                if sig_length == int32(fromHex('f'*8)):
+                    nexts = cls._deserializeNext(buffer, read_bytes)
+                    break
                 sig = buffer[read_bytes:read_bytes+sig_length]
                 read_bytes += sig_length
                 sigs.append(sig)
             key_length = int32(buffer[read_bytes:read_bytes+4])
             read_bytes += 4
-            prv = LmsPrivateKey.deserialize(buffer[read_bytes:read_bytes+key_length])
+            key_buffer = buffer[read_bytes:read_bytes+key_length]
+            nodes, sink = None, None
+            if aux is not None and not lazy:
+                nodes, sink = aux.lookup(len(prvs), key_buffer)
+            prv = LmsPrivateKey.deserialize(key_buffer,
+                                            cache_levels=cache_levels,
+                                            workers=workers,
+                                            nodes=nodes, sink=sink,
+                                            build=not lazy)
             read_bytes += key_length
             prvs.append(prv)
-
-            # Calculate how many remaining signatures this key can generate for us
-            # We need to account for how many levels of keys the current key can generate, and how much each use of a key is "worth"
-            # to be able to calculate how many effective signatures we've expended so far per key.
-            # Based off: 2**(self.levels*h)
-            alg2, m, h = lms_params[prv.lms_type]
-            remaining_signatures_from_key = 2**((levels-len(prvs)+1)*h) - ((2**((levels-len(prvs))*h)*(prv.maxSignatures()-prv.remaining())))
-            remaining_signatures += remaining_signatures_from_key
         if len(prvs) < 1:
             raise ValueError(err_prv_key_deserialize)
+
+        # Each level has its own types, so a buffer without every level
+        # is truncated or damaged
+        params = [(prv.lms_type, prv.lmots_type) for prv in prvs]
+        if len(params) != levels:
+            raise ValueError(err_bad_number_of_levels, str(len(params)))
+
+        # Calculate how many remaining signatures this key can generate for us
+        # Each leaf left in the tree of a level is "worth" the number of
+        # signatures of the trees below it, and each level may have its
+        # own height.
+        below = 1
+        for i in range(levels - 1, -1, -1):
+            alg2, m, h = lms_params[params[i][0]]
+            remaining_signatures += below*prvs[i].remaining()
+            below *= 2**h
         if len(sigs) < 1:
             sigs = None
-        return cls(levels, lms_type=prvs[0].lms_type, lmots_type=prvs[0].lmots_type, \
-                   remaining_signatures=remaining_signatures, prvs=prvs, sigs=sigs)
+        rv = cls(levels, params=params, \
+                 remaining_signatures=remaining_signatures, prvs=prvs, sigs=sigs,
+                 cache_levels=cache_levels, workers=workers,
+                 amortize=amortize, nexts=nexts, lazy=lazy)
+        if lazy:
+            rv._aux = aux
+        return rv
+
+    @staticmethod
+    def _deserializeNext(buffer, pos):
+        _need_length(buffer, pos + 4)
+        count = int32(buffer[pos:pos+4])
+        pos += 4
+        nexts = {}
+        for i in range(0, count):
+            _need_length(buffer, pos + 8)
+            level = int32(buffer[pos:pos+4])
+            end = pos + 8 + int32(buffer[pos+4:pos+8])
+            state, pos = LmsBuildState.deserialize(buffer, pos + 8)
+            if pos != end:
+                raise ValueError(err_prv_key_deserialize)
+            nexts[level] = state
+        return nexts
 
     def prettyPrint(self):
         rv = "HSS private key\n"
@@ -1028,43 +2811,82 @@ class HssPrivateKey(object):
             rv += ("   I         : %s\n" % toHex(prv.I))
             rv += ("   SEED      : %s\n" % toHex(prv.SEED))
             rv += ("   q         : %s\n" % toHex(u32(prv.q)))
-            rv += ("   pub       : %s\n" % toHex(prv.pub))
+            rv += ("   pub       : %s\n" % _pubHex(prv.pub))
         rv += ("   sigs left : %d\n" % self.remaining())
         rv += ("   max signs : %d\n" % self.maxSignatures())
         return rv
 
+class HssPublicKeyCache(object):
+    """
+    Bounded cache of the bottom LMS public keys of HSS signatures whose
+    signed public keys were already verified.  The key is the SHA-256
+    hash of the part of the signature before the message signature, so
+    signatures from the same bottom tree verify only one LMS signature.
+    The least recently used entry is evicted when the cache is full.
+    """
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError(err_bad_value, str(size))
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            pk = self._entries.pop(key, None)
+            if pk is None:
+                self.misses += 1
+                return None
+            self._entries[key] = pk
+            self.hits += 1
+            return pk
+
+    def put(self, key, pk):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = pk
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class HssPublicKey(object):
     """
     Hierarchical Signature System (HSS) Public Key
     """
-    def __init__(self, rootpub, levels):
+    def __init__(self, rootpub, levels, cache_size=None):
         self.pub = rootpub
         self.levels = levels
+        self.cache = None
+        if cache_size:
+            self.cache = HssPublicKeyCache(cache_size)
 
     def verify(self, message, sig):
-        hss_sig = HssSignature.deserialize(sig)
-        if hss_sig.levels != self.levels:
-            return False
-        # verify the chain of signed public keys
-        pk = self.pub
-        for i in range(0, self.levels - 1):
-            if pk.verify(hss_sig.pub[i].serialize(), hss_sig.sig[i].serialize()):
-                pk = hss_sig.pub[i]
-            else:
-                return False
-        # verify the signature on the message
-        return pk.verify(message, hss_sig.lms_sig.serialize())  
+        verifier = self.verifier(sig)
+        verifier.update(message)
+        return verifier.finalize()
+
+    def verifier(self, sig):
+        return HssVerifier(self, sig)
 
     def serialize(self):
         return u32(self.levels) + self.pub.serialize()
 
     @classmethod
-    def deserialize(cls, buffer):
+    def deserialize(cls, buffer, cache_size=None):
         if len(buffer) < 4:
             ValueError(err_bad_length, str(len(buffer)))
         levels = int32(buffer[0:4])
         rootpub = LmsPublicKey.deserialize(buffer[4:])
-        return cls(rootpub, levels)
+        return cls(rootpub, levels, cache_size=cache_size)
         
     def maxSignatures(self):
         alg2, m, h = lms_params[self.pub.lms_type]
@@ -1081,10 +2903,478 @@ class HssPublicKey(object):
         return rv
 
 
+class HssSigner(object):
+    """
+    Incremental HSS signature with an interface similar to hashlib.
+    The leaf of the bottom tree is taken when the signer is created.
+    The signature is size bytes: the cached prefix of the private key
+    followed by the signature of the bottom tree.
+    """
+    def __init__(self, prv):
+        prv.refresh()
+        prv._signatures_remaining += -1
+        prv.buildNext()
+        self.prefix = prv.signaturePrefix()
+        self.lms_signer = prv.prv[-1].signer()
+        self.size = len(self.prefix) + self.lms_signer.size
+
+    def update(self, buf):
+        self.lms_signer.update(buf)
+
+    def finalize(self):
+        out = bytearray(self.size)
+        self.finalizeInto(out)
+        return bytes(out)
+
+    def finalizeInto(self, out, offset=0):
+        """
+        Make the signature like finalize(), writing it into out
+        :param out: a bytearray or writable memoryview with room for
+            size bytes at offset
+        :param offset: where the signature starts in out
+        :return: the number of bytes written
+        """
+        if len(out) - offset < self.size:
+            raise ValueError(err_bad_length, str(len(out) - offset))
+        pos = offset + len(self.prefix)
+        out[offset:pos] = self.prefix
+        return self.lms_signer.finalizeInto(out, pos) - offset
+
+
+class HssVerifier(object):
+    """
+    Incremental HSS signature verification with an interface similar
+    to hashlib.  The signed public keys are checked when the verifier
+    is created, and the signature on the message by finalize().  The
+    signature is parsed in place with HssSignatureView.
+    """
+    def __init__(self, pub, sig):
+        self.lms_verifier = None
+        hss_sig = HssSignatureView(sig)
+        if hss_sig.levels != pub.levels:
+            return
+        key = None
+        if pub.cache is not None and pub.levels > 1:
+            key = hashlib.sha256(hss_sig.buffer[0:hss_sig.lms_sig.offset])
+            key = key.digest()
+            pk = pub.cache.get(key)
+            if pk is not None:
+                self.lms_verifier = pk.verifier(hss_sig.lms_sig)
+                return
+        # verify the chain of signed public keys
+        pk = pub.pub
+        for i in range(0, pub.levels - 1):
+            verifier = pk.verifier(hss_sig.sig[i])
+            verifier.update(hss_sig.pubBuffer(i))
+            if verifier.finalize():
+                pk = hss_sig.pub(i)
+            else:
+                return
+        if key is not None:
+            pub.cache.put(key, pk)
+        self.lms_verifier = pk.verifier(hss_sig.lms_sig)
+
+    def update(self, buf):
+        if self.lms_verifier is not None:
+            self.lms_verifier.update(buf)
+
+    def finalize(self):
+        if self.lms_verifier is None:
+            return False
+        return self.lms_verifier.finalize()
+
+
+class HssAuxData(object):
+    """
+    Sidecar file with the nodes of every LMS tree of a HSS private key,
+    so that loading the key does not compute the trees again.  This is
+    similar to the aux data in the Cisco hash-sigs code.  The file is
+    memory-mapped read-only, so processes share the page cache.
+
+    magic - 8 bytes
+    levels - 4 bytes
+    [LMS type + LMOTS type + I + digest] - 56 bytes for each level
+    [nodes of the tree in the LmsNodeStore layout] for each level
+
+    The digest is SHA-256 over SEED, I, the types, and the nodes, so a
+    stale or damaged level is detected and computed again.
+    """
+    magic = toBytes('hssaux01')
+    entry_size = 4 + 4 + LenI + 32
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.stores = {}
+        self.updated = False
+        self._file = None
+        self._map = None
+        self._entries = []
+        try:
+            self._file = open(filename, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self._entries = self._parse(self._map)
+        except (IOError, OSError, ValueError, KeyError):
+            self.close()
+            self._entries = []
+
+    def _parse(self, buffer):
+        if len(buffer) < len(HssAuxData.magic) + 4 or \
+           buffer[0:len(HssAuxData.magic)] != HssAuxData.magic:
+            raise ValueError(err_bad_value)
+        pos = len(HssAuxData.magic)
+        levels = int32(buffer[pos:pos+4])
+        if levels < 1 or levels > MaxHssLevels:
+            raise ValueError(err_bad_number_of_levels, str(levels))
+        pos += 4
+        offset = pos + (levels*HssAuxData.entry_size)
+        entries = []
+        for i in range(0, levels):
+            lms_type = buffer[pos:pos+4]
+            lmots_type = buffer[pos+4:pos+8]
+            I = buffer[pos+8:pos+8+LenI]
+            digest = buffer[pos+8+LenI:pos+HssAuxData.entry_size]
+            if lms_type not in lms_params:
+                raise ValueError(err_unknown_typecode, toHex(lms_type))
+            if lmots_type not in lmots_params:
+                raise ValueError(err_unknown_typecode, toHex(lmots_type))
+            entries.append((lms_type, lmots_type, I, digest, offset))
+            offset += LmsNodeStore.sizeof(lms_type)
+            pos += HssAuxData.entry_size
+        if len(buffer) < offset:
+            raise ValueError(err_bad_length, str(len(buffer)))
+        return entries
+
+    @staticmethod
+    def _key(lms_type, lmots_type, I, SEED):
+        return SEED + I + lms_type + lmots_type
+
+    def lookup(self, level, key_buffer):
+        """
+        Find the nodes for one level of the private key
+        :param level: the level in the HSS hierarchy
+        :param key_buffer: the serialized LmsPrivateKey of the level
+        :return: the verified nodes and None, or None and a sink that
+            collects the nodes while the tree is computed, or None and
+            None if the key has unknown types
+        """
+        lms_type = key_buffer[0:4]
+        lmots_type = key_buffer[4:8]
+        if lms_type not in lms_params or lmots_type not in lmots_params:
+            return None, None
+        alg, n, p, w, ls = lmots_params[lmots_type]
+        SEED = key_buffer[8:8+n]
+        I = key_buffer[8+n:8+n+LenI]
+        key = HssAuxData._key(lms_type, lmots_type, I, SEED)
+        if level < len(self._entries):
+            e_lms_type, e_lmots_type, e_I, digest, offset = self._entries[level]
+            if (e_lms_type, e_lmots_type, e_I) == (lms_type, lmots_type, I):
+                store = LmsNodeStore(lms_type, self._map, offset)
+                if store.digest(key) == digest:
+                    self.stores[level] = (store, key, digest)
+                    return store, None
+        store = LmsNodeStore(lms_type)
+        self.stores[level] = (store, key, None)
+        self.updated = True
+        return None, store
+
+    def invalidate(self):
+        """
+        Forget the stored nodes, so every level is computed again
+        """
+        self.close()
+        self._entries = []
+        self.stores = {}
+
+    def save(self, hss_prv):
+        """
+        Write the sidecar file again if any level was computed, or if
+        a tree was replaced since the key was loaded
+        :param hss_prv: the HssPrivateKey that was loaded
+        """
+        if len(hss_prv.prv) != hss_prv.levels:
+            return
+        updated = self.updated
+        stores = {}
+        for i, prv in enumerate(hss_prv.prv):
+            key = HssAuxData._key(prv.lms_type, prv.lmots_type, prv.I,
+                                  prv.SEED)
+            if i in self.stores and self.stores[i][1] == key:
+                stores[i] = self.stores[i]
+                continue
+            # a tree made by refresh(), which keeps all of its nodes
+            # unless there are cache_levels
+            alg2, m, h = lms_params[prv.lms_type]
+            nodes = prv._nodes
+            if not isinstance(nodes, LmsNodeStore) or \
+               nodes.count != 2**(h+1):
+                return
+            stores[i] = (nodes, key, None)
+            updated = True
+        if not updated:
+            return
+        self.stores = stores
+        self.updated = True
+        entries = toBytes('')
+        for i, prv in enumerate(hss_prv.prv):
+            store, key, digest = self.stores[i]
+            if digest is None:
+                digest = store.digest(key)
+            entries += prv.lms_type + prv.lmots_type + prv.I + digest
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(HssAuxData.magic + u32(len(hss_prv.prv)) + entries)
+            for i in range(0, len(hss_prv.prv)):
+                store = self.stores[i][0]
+                pos = store.offset
+                end = store.offset + LmsNodeStore.sizeof(store.lms_type)
+                while pos < end:
+                    f.write(store.buffer[pos:min(end, pos + (1 << 20))])
+                    pos += (1 << 20)
+            f.flush()
+            os.fsync(f.fileno())
+        # the trees that were loaded keep using the old mapping
+        try:
+            replaceFile(tmp_filename, self.filename)
+        except OSError:
+            os.remove(tmp_filename)
+            return
+        self.updated = False
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class HssKeygenState(object):
+    """
+    Progress of the computation of the trees of a new HSS private key,
+    so that genkey can continue after the program stops.  The file has
+    the SEED and I of each tree, so it must be kept as secret as the
+    private key, but it can never be used to sign: it has no leaf
+    counters or signatures, and it starts with a magic value that is
+    not an LMS type.  It is removed once the private key is saved.
+
+    magic - 16 bytes
+    levels - 4 bytes
+    cache_levels - 4 bytes, all 1's for None
+    number of trees - 4 bytes
+    [LmsBuildState without the stored nodes] for each tree
+
+    The stored nodes are in filename.nodes, in the LmsNodeStore layout
+    of each level one after the other.  Each save writes only the
+    nodes of the subtrees that are done since the last save.
+    """
+    magic = toBytes('hssgenkeystate01')
+
+    def __init__(self, filename, params, cache_levels=None, interval=None):
+        self.filename = filename
+        self.nodes_filename = filename + '.nodes'
+        self.params = params
+        self.levels = len(params)
+        self.cache_levels = cache_levels
+        self.interval = interval
+        self.trees = []
+        # the subtree roots of each tree in filename.nodes
+        self._written = []
+
+    def _cacheLevels(self):
+        if self.cache_levels is None:
+            return 0xffffffff
+        return self.cache_levels
+
+    def _region(self, level):
+        # The offset and the number of nodes of the LmsNodeStore of one
+        # level in filename.nodes
+        offset = 0
+        for i in range(0, level + 1):
+            alg2, m, h = lms_params[self.params[i][0]]
+            count = 2**(h+1)
+            if self.cache_levels is not None and self.cache_levels < h:
+                count = 2**(self.cache_levels+1)
+            if i < level:
+                offset += count*m
+        return offset, count
+
+    @staticmethod
+    def _fresh(roots, written, count):
+        # The ranges of node numbers below roots and not below written,
+        # as (first, last + 1), that are less than count
+        above = set()
+        for r in written:
+            r >>= 1
+            while r and r not in above:
+                above.add(r)
+                r >>= 1
+        rv = []
+        todo = [r for r in roots if r not in written]
+        while todo:
+            r = todo.pop()
+            if r >= count or r in written:
+                continue
+            if r in above:
+                rv.append((r, r + 1))
+                todo.extend([2*r, 2*r + 1])
+                continue
+            first, last = r, r + 1
+            while first < count:
+                rv.append((first, min(last, count)))
+                first, last = 2*first, 2*last
+        return rv
+
+    def load(self):
+        """
+        Read the trees from the file
+        :raises ValueError: if the file is damaged or it is for other
+            parameters
+        """
+        with open(self.filename, 'rb') as f:
+            buffer = f.read()
+        pos = len(HssKeygenState.magic)
+        if len(buffer) < pos + 12 or buffer[0:pos] != HssKeygenState.magic:
+            raise ValueError(err_bad_value, self.filename)
+        if int32(buffer[pos:pos+4]) != self.levels or \
+           int32(buffer[pos+4:pos+8]) != self._cacheLevels():
+            raise ValueError(err_bad_value, self.filename)
+        count = int32(buffer[pos+8:pos+12])
+        pos += 12
+        if count > self.levels:
+            raise ValueError(err_bad_number_of_levels, str(count))
+        trees = []
+        for i in range(0, count):
+            state, pos = LmsBuildState.deserialize(buffer, pos)
+            if (state.lms_type, state.lmots_type) != tuple(self.params[i]):
+                raise ValueError(err_bad_value, toHex(state.lms_type))
+            trees.append(state)
+        try:
+            with open(self.nodes_filename, 'rb') as f:
+                for i in range(0, count):
+                    offset, number = self._region(i)
+                    m = lms_params[self.params[i][0]][1]
+                    f.seek(offset)
+                    nodes = bytearray(f.read(number*m))
+                    if len(nodes) < number*m:
+                        nodes.extend(bytearray(number*m - len(nodes)))
+                    trees[i].store = LmsNodeStore(self.params[i][0], nodes,
+                                                  count=number)
+        except IOError:
+            raise ValueError(err_bad_value, self.nodes_filename)
+        self.trees = trees
+        self._written = [set(state.roots) for state in trees]
+
+    def tree(self, level):
+        """
+        The build state of the tree of one level, which is new unless
+        it was loaded
+        :param level: the level in the HSS hierarchy
+        :return: the LmsBuildState
+        """
+        if level < len(self.trees):
+            state = self.trees[level]
+        else:
+            state = LmsBuildState(self.params[level][0],
+                                  self.params[level][1])
+            self.trees.append(state)
+        state.interval = self.interval
+        state.save = self.save
+        return state
+
+    def save(self):
+        """
+        Write the new nodes to filename.nodes, and then replace the file
+        with the progress of every tree
+        """
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        fd = os.open(self.nodes_filename, flags, 0o600)
+        try:
+            for i in range(0, len(self.trees)):
+                state = self.trees[i]
+                if i == len(self._written):
+                    self._written.append(set())
+                store = state.store
+                if store is None:
+                    continue
+                offset, count = self._region(i)
+                m = store.m
+                for first, last in self._fresh(state.roots,
+                                               self._written[i],
+                                               store.count):
+                    start = store.offset + first*m
+                    data = bytes(store.buffer[start:start +
+                                              (last - first)*m])
+                    if pwrite(fd, data, offset + first*m) != len(data):
+                        raise IOError(err_bad_length, self.nodes_filename)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(HssKeygenState.magic + u32(self.levels) + \
+                    u32(self._cacheLevels()) + u32(len(self.trees)))
+            for state in self.trees:
+                f.write(state.serialize(store=False))
+            f.flush()
+            os.fsync(f.fileno())
+        replaceFile(tmp_filename, self.filename)
+        self._written = [set(state.roots) for state in self.trees]
+
+    def remove(self):
+        """
+        Remove the files once the private key is saved
+        """
+        for filename in (self.filename, self.nodes_filename):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
 # ----------------------------------------------------------------------
 # The public interface for the HSS/LMS signature and keys
 # ----------------------------------------------------------------------
 
+# Files are given to the signer and verifier in pieces of this size
+#
+FileChunkSize = 1 << 20
+
+# Genkey saves its progress after this many leaves when it resumes
+# without a checkpoint interval
+#
+GenkeyCheckpointLeaves = 1 << 12
+
+# With amortize, keyname.prv is written in full to save the progress of
+# the replacement trees after this many more of their leaves are done
+#
+NextTreeSaveLeaves = 1 << 6
+
+# verify_many keeps this many public keys that were given serialized,
+# in each process
+#
+BatchPublicKeys = 16
+
+
+def _open_message(pathname):
+    # '-' is standard input
+    if pathname == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin), False
+    try:
+        return open(pathname, 'rb'), True
+    except IOError:
+        raise NoFileError
+
+
+def _update_from_file(hasher, f):
+    while True:
+        buf = f.read(FileChunkSize)
+        if not buf:
+            break
+        hasher.update(buf)
+
+
 class HssLmsSignature():
 
     def __init__(self, filename):
@@ -1123,7 +3413,9 @@ class HssLmsSignature():
 
 class HssLmsPrivateKey():
 
-    def __init__(self, keyname):
+    def __init__(self, keyname, cache_levels=None, workers=None, aux=False,
+                 reserve=1, sync='fsync', precompute=None, background=False,
+                 amortize=False, lazy=False, precompute_interval=None):
         """
         Load a HSS/LMS private and public keys from files.
 
@@ -1132,6 +3424,58 @@ class HssLmsPrivateKey():
         keyname: :class:`str`
             The key name.  Two files will be created based on this
             name: keyname.prv and keyname.pub.
+        cache_levels: :class:`int`
+            The number of levels below the root of each LMS tree that
+            are kept in memory.  The authentication path for the other
+            levels is computed a little at a time with each signature.
+            The default, None, keeps the whole tree in memory.
+        workers: :class:`int`
+            The number of processes used to compute the LMS trees.
+            The default, None, computes them in this process.
+        aux: :class:`bool`
+            Set to True to load the LMS trees from keyname.aux instead
+            of computing them.  The file is created, or written again,
+            when it is missing or does not match the private key.
+        reserve: :class:`int`
+            The number of leaves that are reserved with each write of
+            keyname.prv.  The reserved leaves are used for the next
+            signatures without writing the file again.  If the program
+            stops, the unused reserved leaves are skipped; they are
+            never used twice.
+        sync: :class:`str`
+            How each write of keyname.prv reaches the disk: 'fsync',
+            'fdatasync', or 'none'.  When the trees have not changed,
+            only the 4-byte q of the bottom tree is written in place;
+            otherwise the file is replaced.
+        precompute: :class:`int`
+            The number of next leaves of the bottom tree for which the
+            LM-OTS chains are computed ahead, every precompute_interval
+            steps, so that signing runs fewer steps for each chain.
+            They are computed by fill(), or by a background thread.
+            The default, None, computes nothing ahead.
+        background: :class:`bool`
+            Set to True to compute the precomputed leaves in a
+            background thread.
+        amortize: :class:`bool`
+            Set to True to compute the tree that replaces each lower
+            level a few leaves at a time with each signature, so that
+            no signature waits for a whole tree.  The progress is saved
+            in keyname.prv: the roots of the subtrees that are done,
+            and with cache_levels the 2^(cache_levels+1) top nodes of
+            each tree, which adds about 2^(cache_levels+1)*m bytes for
+            each lower level.  Without cache_levels, the nodes are not
+            saved, and the part of the trees that is done is computed
+            again when the key is loaded.
+        lazy: :class:`bool`
+            Set to True to only read keyname.prv, without computing the
+            LMS trees, such as to look at remaining() or
+            maxSignatures().  The trees are computed by warm(), or
+            before the first signature.
+        precompute_interval: :class:`int`
+            The number of chain steps between the precomputed values;
+            signing runs at most precompute_interval-1 steps for each
+            chain.  The default, None, uses about sqrt(2^w) steps: 16
+            for w=8, 4 for w=4, 2 for w=2, and 1 for w=1.
 
         Returns
         -------
@@ -1163,13 +3507,270 @@ class HssLmsPrivateKey():
             raise NoFileError
         self.pub_filename = pub_filename
         self.prv_filename = prv_filename
+        self.reserve = max(1, reserve)
+        self._reserved = 0
+        if sync not in ('fsync', 'fdatasync', 'none'):
+            raise ValueError(err_bad_value, str(sync))
+        self.sync = sync
         self.hss_pub = HssPublicKey.deserialize(pub_buffer)
-        self.hss_prv = HssPrivateKey.deserialize(prv_buffer)
+        self.aux = None
+        if aux:
+            self.aux = HssAuxData(os.path.abspath(keyname + '.aux'))
+        # the trees are computed by warm()
+        self.hss_prv = HssPrivateKey.deserialize(prv_buffer,
+                                                 cache_levels=cache_levels,
+                                                 workers=workers,
+                                                 aux=self.aux,
+                                                 amortize=amortize,
+                                                 lazy=True)
+        self._loaded = (prv_buffer, cache_levels, workers, amortize)
+        self._warmed = False
+        self._warmer = None
+        self._warm_lock = threading.Lock()
+        # the generation of the trees in keyname.prv, if it has the
+        # layout that serialize() produces
+        self._generation = None
+        if self.hss_prv.serialize() == prv_buffer:
+            self._generation = self.hss_prv.generation
+        self._next_saved = self.hss_prv.nextLeaves()
+        self.precompute = precompute
+        self.precompute_interval = precompute_interval
+        self.background = background
+        self._checkpoints = None
+        if not lazy:
+            self.warm()
+
+    def warm(self, background=False):
+        """
+        Compute the LMS trees of a key that was loaded with lazy, so
+        that the first signature does not wait for them.  Does nothing
+        when they are already computed.
+
+        Parameters
+        ----------
+        background: :class:`bool`
+            Set to True to compute the trees in a background thread.
+            A signature that is made before the thread is done waits
+            for it.
+        """
+        if not background:
+            self._warm()
+        elif not self._warmed and self._warmer is None:
+            self._warmer = threading.Thread(target=self._warm)
+            self._warmer.daemon = True
+            self._warmer.start()
+
+    def _warm(self):
+        with self._warm_lock:
+            if self._warmed:
+                return
+            self.hss_prv.warm()
+            if self.aux is not None:
+                if not self._rootsMatch():
+                    prv_buffer, cache_levels, workers, amortize = self._loaded
+                    self.aux.invalidate()
+                    self.hss_prv = HssPrivateKey.deserialize(prv_buffer,
+                                       cache_levels=cache_levels,
+                                       workers=workers, aux=self.aux,
+                                       amortize=amortize)
+                try:
+                    self.aux.save(self.hss_prv)
+                except IOError:
+                    pass
+            self._loaded = None
+            self._precompute()
+            self._next_saved = self.hss_prv.nextLeaves()
+            self._warmed = True
+
+    def remaining(self):
+        """
+        The number of signatures that the key can still make.  The
+        trees are not needed.
+
+        Returns
+        -------
+        rv: :class:`int`
+            The number of signatures left.
+        """
+        return self.hss_prv.remaining()
+
+    def maxSignatures(self):
+        """
+        The number of signatures that the key can make in all.  The
+        trees are not needed.
+
+        Returns
+        -------
+        rv: :class:`int`
+            The number of signatures of a new key.
+        """
+        return self.hss_prv.maxSignatures()
+
+    def _precompute(self):
+        # Starts the checkpoint cache of the bottom tree when the tree
+        # is new
+        prv = self.hss_prv.prv[-1]
+        if not self.precompute or prv.checkpoints is not None or \
+           prv.is_exhausted():
+            return
+        if self._checkpoints is not None:
+            self._checkpoints.close()
+        self._checkpoints = LmsCheckpointCache(prv, self.precompute,
+                                               self.precompute_interval,
+                                               background=self.background)
+
+    def fill(self, limit=None):
+        """
+        Compute the LM-OTS chain checkpoints of the next leaves, such as
+        when the program is idle.  Does nothing unless precompute was
+        given.
+
+        Parameters
+        ----------
+        limit: :class:`int`
+            The most leaves to compute; None computes all of them.
+
+        Returns
+        -------
+        rv: :class:`int`
+            The number of leaves that were computed.
+        """
+        if self._checkpoints is None:
+            return 0
+        return self._checkpoints.fill(limit)
+
+    def close(self):
+        """
+        Stop the background thread and zero the precomputed
+        checkpoints.
+        """
+        if self._checkpoints is not None:
+            self._checkpoints.close()
+            self._checkpoints = None
+
+    def _syncFile(self, fd):
+        if self.sync == 'fdatasync' and hasattr(os, 'fdatasync'):
+            os.fdatasync(fd)
+        elif self.sync != 'none':
+            os.fsync(fd)
+
+    def _writeState(self, buffer):
+        # Replaces keyname.prv, so a crash leaves the old or new file
+        tmp_filename = self.prv_filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.write(buffer)
+            f.flush()
+            self._syncFile(f.fileno())
+        replaceFile(tmp_filename, self.prv_filename)
+        if self.sync != 'none':
+            try:
+                fd = os.open(os.path.dirname(self.prv_filename), os.O_RDONLY)
+            except OSError:
+                return
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+    def _writeCounter(self, level, q):
+        # Writes q of one level in place in keyname.prv
+        offset = self.hss_prv.qOffset(level)
+        fd = os.open(self.prv_filename, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            if pwrite(fd, u32(q), offset) != 4:
+                raise IOError(err_bad_length, self.prv_filename)
+            self._syncFile(fd)
+        finally:
+            os.close(fd)
+
+    def _reserveLeaf(self):
+        # Makes sure that the next leaf of the bottom tree is recorded
+        # as used in keyname.prv before it is used
+        self._warm()
+        if self._reserved > 0:
+            return True
+        hss_prv = self.hss_prv
+        hss_prv.refresh()
+        count = min(self.reserve, hss_prv.prv[-1].remaining())
+        # the progress of the replacement trees is saved now and then
+        leaves = hss_prv.nextLeaves()
+        refreshed = False
+        try:
+            if self._generation == hss_prv.generation and \
+               leaves - self._next_saved < NextTreeSaveLeaves:
+                self._writeCounter(len(hss_prv.prv) - 1,
+                                   hss_prv.prv[-1].q + count)
+            else:
+                self._writeState(hss_prv.serialize(reserved=count))
+                refreshed = self._generation != hss_prv.generation
+                self._generation = hss_prv.generation
+                self._next_saved = leaves
+        except (IOError, OSError):
+            return False
+        # the sidecar has the nodes of the trees that were replaced
+        if refreshed and self.aux is not None:
+            try:
+                self.aux.save(hss_prv)
+            except (IOError, OSError):
+                pass
+        self._reserved = count
+        return True
+
+    def _sign(self, buffer):
+        if not self._reserveLeaf():
+            return None
+        self._precompute()
+        sig_buffer = self.hss_prv.sign(buffer)
+        self._reserved -= 1
+        return sig_buffer
+
+    def signer(self):
+        """
+        Start an incremental signature.  The leaf is recorded as used
+        in keyname.prv before the signer is returned.  Give the message
+        to update() in pieces, then call finalize() for the signature.
+
+        Returns
+        -------
+        signer: :class:`HssSigner`
+            Has update(buffer) and finalize() methods.
+
+        Raises
+        ------
+        ValueError
+            If the private key is exhausted.
+        IOError
+            If the private key file cannot be written.
+        """
+        if not self._reserveLeaf():
+            raise IOError(self.prv_filename)
+        self._precompute()
+        signer = self.hss_prv.signer()
+        self._reserved -= 1
+        return signer
+
+    def _rootsMatch(self):
+        # the root of the top tree is in the public key, and the root of
+        # each other tree is signed by the tree above it
+        hss_prv = self.hss_prv
+        if hss_prv.pub[0].serialize() != self.hss_pub.pub.serialize():
+            return False
+        for i in range(1, len(hss_prv.prv)):
+            if not hss_prv.pub[i-1].verify(hss_prv.pub[i].serialize(),
+                                           hss_prv.sig[i-1]):
+                return False
+        return True
 
     @classmethod
     def genkey(cls, keyname, levels=2,
                lms_type=lms_sha256_m32_h5,
-               lmots_type=lmots_sha256_n32_w8):
+               lmots_type=lmots_sha256_n32_w8,
+               cache_levels=None, workers=None, aux=False, reserve=1,
+               sync='fsync', checkpoint=None, resume=False, progress=None,
+               params=None, amortize=False, precompute=None,
+               background=False, precompute_interval=None):
         """
         Generate a HSS/LMS private and public keys, saving them
         in files.
@@ -1221,6 +3822,48 @@ from .pyhsslms import lms_shake_m24_h25
                 pyhsslms.lmots_shake_n24_w2
                 pyhsslms.lmots_shake_n24_w4
                 pyhsslms.lmots_shake_n24_w8
+        cache_levels: :class:`int`
+            The number of levels below the root of each LMS tree that
+            are kept in memory; None keeps the whole tree.
+        workers: :class:`int`
+            The number of processes used to compute the LMS trees;
+            None computes them in this process.
+        aux: :class:`bool`
+            Set to True to also save the LMS trees in keyname.aux.
+        reserve: :class:`int`
+            The number of leaves that are reserved with each write of
+            keyname.prv.
+        sync: :class:`str`
+            How each write of keyname.prv reaches the disk: 'fsync',
+            'fdatasync', or 'none'.
+        checkpoint: :class:`int`
+            Save the progress in keyname.genkey-state each time this
+            many more leaves are computed; None does not save it.
+        resume: :class:`bool`
+            Set to True to continue from keyname.genkey-state, when it
+            exists, with the same parameters.  The file is removed once
+            keyname.prv is saved.
+        progress: :class:`function`
+            Called with a :class:`HssKeygenProgress` after each step
+            of the computation of the trees.
+        params: :class:`list`
+            A list of (lms_type, lmots_type) for each level, such as a
+            tall top tree and a short bottom tree.  When it is given,
+            it is used instead of levels, lms_type and lmots_type.
+        amortize: :class:`bool`
+            Set to True to compute the tree that replaces each lower
+            level a few leaves at a time with each signature.  See
+            HssLmsPrivateKey for what is saved in keyname.prv.
+        precompute: :class:`int`
+            The number of next leaves of the bottom tree for which the
+            LM-OTS chains are computed ahead; None computes nothing
+            ahead.
+        background: :class:`bool`
+            Set to True to compute the precomputed leaves in a
+            background thread.
+        precompute_interval: :class:`int`
+            The number of chain steps between the precomputed values;
+            None uses about sqrt(2^w) steps.
 
         Returns
         -------
@@ -1230,16 +3873,13 @@ from .pyhsslms import lms_shake_m24_h25
         Raises
         ------
         ValueError
-            If the parameters have inconsistent values.
+            If the parameters have inconsistent values, or they do not
+            match keyname.genkey-state.
         FileExistsError or IOError
-            If keyname.prv and keyname.pub already exists.
+            If keyname.prv and keyname.pub already exists, or if
+            keyname.genkey-state exists and resume is False.
         """
-        if levels < 1 or levels > MaxHssLevels:
-            raise ValueError(err_bad_number_of_levels)
-        if not lms_type in lms_params:
-            raise ValueError(err_unknown_typecode)
-        if not lmots_type in lmots_params:
-            raise ValueError(err_unknown_typecode)
+        params = hss_params(levels, lms_type, lmots_type, params)
         key_filename = os.path.abspath(keyname)
         prv_filename = key_filename + '.prv'
         if os.path.exists(prv_filename):
@@ -1247,8 +3887,23 @@ from .pyhsslms import lms_shake_m24_h25
         pub_filename = key_filename + '.pub'
         if os.path.exists(pub_filename):
             raise FoundFileError
-        hss_prv = HssPrivateKey(levels=levels,
-                      lms_type=lms_type, lmots_type=lmots_type)
+        keygen = None
+        state_filename = key_filename + '.genkey-state'
+        if os.path.exists(state_filename) and not resume:
+            raise FoundFileError
+        if checkpoint is not None or resume:
+            if checkpoint is None:
+                checkpoint = GenkeyCheckpointLeaves
+            keygen = HssKeygenState(state_filename, params, cache_levels,
+                                    checkpoint)
+            if os.path.exists(state_filename):
+                keygen.load()
+        builder = HssKeygen(cache_levels=cache_levels, workers=workers,
+                            state=keygen, params=params)
+        for step in builder.steps():
+            if progress is not None:
+                progress(step)
+        hss_prv = builder.key
         try:
             with open(prv_filename, 'wb') as prv_file:
                 prv_file.write(hss_prv.serialize())
@@ -1259,16 +3914,24 @@ from .pyhsslms import lms_shake_m24_h25
                 pub_file.write(hss_prv.publicKey().serialize())
         except IOError:
            return False
-        return cls(key_filename)
+        if keygen is not None:
+            keygen.remove()
+        return cls(key_filename, cache_levels=cache_levels, workers=workers,
+                   aux=aux, reserve=reserve, sync=sync, amortize=amortize,
+                   precompute=precompute, background=background,
+                   precompute_interval=precompute_interval)
 
     def signFile(self, filename):
         """
-        Sign a file.  Produces signature in filename.sig file.
+        Sign a file.  Produces signature in filename.sig file.  The
+        file is read in pieces, so it does not need to fit in memory.
 
         Parameters
         ----------
         filename: :class:`str`
-            The name of the file to sign.
+            The name of the file to sign.  If it is '-', the message
+            is read from standard input and the signature is written
+            to standard output.
 
         Returns
         -------
@@ -1284,23 +3947,32 @@ from .pyhsslms import lms_shake_m24_h25
         FileExistsError or IOError
             if the filename.sig file already exists.
         """
-        pathname = os.path.abspath(filename)
-        if not os.path.exists(pathname):
-            raise NoFileError
-        sig_pathname = os.path.abspath(filename + '.sig')
-        if os.path.exists(sig_pathname):
-            raise FoundFileError
-        try:
-            with open(pathname, 'rb') as to_sign_file:
-                buffer = to_sign_file.read()
-        except IOError:
-            raise NoFileError
-        sig_buffer = self.hss_prv.sign(buffer)
+        if filename == '-':
+            pathname = filename
+            sig_pathname = None
+        else:
+            pathname = os.path.abspath(filename)
+            if not os.path.exists(pathname):
+                raise NoFileError
+            sig_pathname = os.path.abspath(filename + '.sig')
+            if os.path.exists(sig_pathname):
+                raise FoundFileError
+        f, close = _open_message(pathname)
         try:
-            with open(self.prv_filename, 'wb') as f:
-                f.write(self.hss_prv.serialize())
-        except IOError:
-            return False
+            try:
+                signer = self.signer()
+            except IOError:
+                return False
+            _update_from_file(signer, f)
+        finally:
+            if close:
+                f.close()
+        sig_buffer = signer.finalize()
+        if sig_pathname is None:
+            out = getattr(sys.stdout, 'buffer', sys.stdout)
+            out.write(sig_buffer)
+            out.flush()
+            return True
         try:
             with open(sig_pathname, 'wb') as sig_file:
                 sig_file.write(sig_buffer)
@@ -1329,17 +4001,61 @@ from .pyhsslms import lms_shake_m24_h25
         FileNotFoundError or IOError
             If the private key file is not found.
         """
-        sig_buffer = self.hss_prv.sign(buffer)
-        try:
-            with open(self.prv_filename, 'wb') as f:
-                f.write(self.hss_prv.serialize())
-        except IOError:
+        sig_buffer = self._sign(buffer)
+        if sig_buffer is None:
             return toBytes('')
         return sig_buffer
 
+    def signInto(self, buffer, out, offset=0):
+        """
+        Sign a buffer, writing the signature into a buffer that the
+        caller gives, so that nothing is allocated for the result.
+
+        Parameters
+        ----------
+        buffer: :class:`bytes`
+            The buffer to sign.
+        out: :class:`bytearray` or :class:`memoryview`
+            Where the signature is written.  It needs room for
+            signatureLength() bytes at offset.
+        offset: :class:`int`
+            Where the signature starts in out.
+
+        Returns
+        -------
+        rv: :class:`int`
+            The length of the signature; zero if something went wrong.
+
+        Raises
+        ------
+        ValueError
+            If the private key is exhausted, or out is too short.
+        FileNotFoundError or IOError
+            If the private key file is not found.
+        """
+        if len(out) - offset < self.signatureLength():
+            raise ValueError(err_bad_length, str(len(out) - offset))
+        if not self._reserveLeaf():
+            return 0
+        self._precompute()
+        rv = self.hss_prv.signInto(buffer, out, offset)
+        self._reserved -= 1
+        return rv
+
+    def signatureLength(self):
+        """
+        The length of the signatures in bytes.
+
+        Returns
+        -------
+        rv: :class:`int`
+            The length of the signature that sign() returns.
+        """
+        return self.hss_prv.signatureLength()
+
 
 class HssLmsPublicKey():
-    def __init__(self, keyname):
+    def __init__(self, keyname, cache_size=None):
         """
         Load a HSS/LMS public key from the keyname.pub file.
 
@@ -1347,6 +4063,12 @@ class HssLmsPublicKey():
         ----------
         keyname: :class:`str`
             The key name.  It identifies the keyname.pub file.
+        cache_size: :class:`int`
+            The number of verified signed public keys to remember, so
+            that signatures from the same bottom tree only check the
+            signature on the message.  The default, None, remembers
+            none.  The counters are in hss_pub.cache.hits and
+            hss_pub.cache.misses.
 
         Returns
         -------
@@ -1372,7 +4094,8 @@ class HssLmsPublicKey():
         except IOError:
             raise NoFileError
         self.pub_filename = pub_filename
-        self.hss_pub = HssPublicKey.deserialize(pub_buffer)
+        self.hss_pub = HssPublicKey.deserialize(pub_buffer,
+                                                cache_size=cache_size)
 
     def I(self):
         """
@@ -1385,14 +4108,20 @@ class HssLmsPublicKey():
         """
         return self.hss_pub.pub.I
 
-    def verifyFile(self, filename):
+    def verifyFile(self, filename, sig_filename=None):
         """
         Verify the signature on a file.  Signature is in filename.sig.
+        The file is read in pieces, so it does not need to fit in
+        memory.
 
         Parameters
         ----------
         filename: :class:`str`
-            The name of the file to that was signed.
+            The name of the file to that was signed.  If it is '-',
+            the message is read from standard input.
+        sig_filename: :class:`str`
+            The name of the signature file, if it is not filename.sig.
+            Needed when filename is '-'.
 
         Returns
         -------
@@ -1404,27 +4133,36 @@ class HssLmsPublicKey():
         FileNotFoundError or IOError
             If the file to be signed is not found.
         """
-        if filename.endswith('.sig'):
+        if sig_filename is not None:
+            sig_pathname = os.path.abspath(sig_filename)
+            pathname = filename
+            if filename != '-':
+                pathname = os.path.abspath(filename)
+        elif filename == '-':
+            raise NoFileError
+        elif filename.endswith('.sig'):
             sig_pathname = os.path.abspath(filename)
             pathname = os.path.splitext(sig_pathname)[0]
         else:
             sig_pathname = os.path.abspath(filename + '.sig')
             pathname = os.path.abspath(filename)
-        if not os.path.exists(pathname):
+        if pathname != '-' and not os.path.exists(pathname):
             raise NoFileError
         if not os.path.exists(sig_pathname):
             raise NoFileError
-        try:
-            with open(pathname, 'rb') as f:
-                buffer = f.read()
-        except IOError:
-            raise NoFileError
         try:
             with open(sig_pathname, 'rb') as f:
                 sigbuffer = f.read()
         except IOError:
             raise NoFileError
-        return self.hss_pub.verify(buffer, sigbuffer)
+        verifier = self.hss_pub.verifier(sigbuffer)
+        f, close = _open_message(pathname)
+        try:
+            _update_from_file(verifier, f)
+        finally:
+            if close:
+                f.close()
+        return verifier.finalize()
 
     def verify(self, buffer, sig):
         """
@@ -1443,3 +4181,162 @@ class HssLmsPublicKey():
             Set to True for success; otherwise set to False.
         """
         return self.hss_pub.verify(buffer, sig)
+
+    def verifier(self, sig):
+        """
+        Start an incremental signature verification.  Give the message
+        to update() in pieces, then call finalize() for the result.
+
+        Parameters
+        ----------
+        sig: :class:`bytes`
+            The signature value.
+
+        Returns
+        -------
+        verifier: :class:`HssVerifier`
+            Has update(buffer) and finalize() methods; finalize()
+            returns True if the signature is valid.
+        """
+        return self.hss_pub.verifier(sig)
+
+
+
+# ----------------------------------------------------------------------
+# Verification of many signatures
+# ----------------------------------------------------------------------
+
+# The public keys that were loaded in a worker process of verify_many,
+# by serialized value
+#
+_batch_keys = None
+
+
+def _batch_init(size):
+    global _batch_keys
+    _batch_keys = HssPublicKeyCache(size)
+
+
+def _batch_buffer(value):
+    # A text string is the name of a file to read
+    if isinstance(value, type(u'')):
+        with open(value, 'rb') as f:
+            return f.read()
+    return value
+
+
+def _batch_verify(args, keys=None):
+    """
+    Verify one signature in a worker process, or in this one
+    :param args: the index, the HssPublicKey or its serialized value,
+        the message or its file name, the signature or its file name,
+        and the size of the cache of verified signed public keys
+    :param keys: the HssPublicKeyCache of the serialized public keys
+        that were loaded; None for the one of the worker process
+    :return: the index, the result, and True if an error was raised
+    """
+    index, pub, message, sig, cache_size = args
+    try:
+        if not isinstance(pub, HssPublicKey):
+            if keys is None:
+                keys = _batch_keys
+            pub_buffer = pub
+            pub = keys.get(pub_buffer)
+            if pub is None:
+                pub = HssPublicKey.deserialize(pub_buffer,
+                                               cache_size=cache_size)
+                keys.put(pub_buffer, pub)
+        verifier = pub.verifier(_batch_buffer(sig))
+        if isinstance(message, type(u'')):
+            f, close = _open_message(message)
+            try:
+                _update_from_file(verifier, f)
+            finally:
+                if close:
+                    f.close()
+        else:
+            verifier.update(message)
+        return index, verifier.finalize(), False
+    except (ValueError, IOError, OSError):
+        return index, False, True
+
+
+def verify_many(items, workers=None, ordered=True, stats=None,
+                cache_size=64, chunksize=8):
+    """
+    Verify many signatures, in a pool of processes if workers is given.
+    Each public key is loaded once in each process, together with a
+    cache of the signed public keys that were already verified; the
+    last BatchPublicKeys of them are kept.  Without workers, the
+    HssPublicKey objects that are given are used, with their caches.
+    :param items: an iterable of (public key, message, signature); the
+        public key is a HssLmsPublicKey, a HssPublicKey, or a serialized
+        HSS public key; the message and the signature are buffers, or
+        text strings that name the files to read
+    :param workers: the number of processes; None verifies in this one
+    :param ordered: if True, the results are in the order of the items;
+        otherwise they are in the order they are done
+    :param stats: a dict that is updated with the counts of 'verified',
+        'valid', 'invalid', and 'errors', the elapsed 'seconds', and
+        the signatures 'per_second'
+    :param cache_size: the size of the cache of verified signed public
+        keys for each public key
+    :param chunksize: the number of items sent to a process at a time
+    :return: a generator of (index, result) for the items
+    """
+    if stats is None:
+        stats = {}
+    stats.update({'verified': 0, 'valid': 0, 'invalid': 0, 'errors': 0,
+                  'seconds': 0.0, 'per_second': 0.0})
+    start = time.time()
+
+    def tasks(serialize):
+        serialized = {}
+        for index, (pub, message, sig) in enumerate(items):
+            if isinstance(pub, HssLmsPublicKey):
+                pub = pub.hss_pub
+            if isinstance(pub, HssPublicKey):
+                if not serialize:
+                    yield index, pub, message, sig, cache_size
+                    continue
+                if id(pub) not in serialized:
+                    serialized[id(pub)] = (pub, pub.serialize())
+                pub = serialized[id(pub)][1]
+            elif not isinstance(pub, bytes):
+                pub = bytes(bytearray(pub))
+            yield index, pub, message, sig, cache_size
+
+    def count(result):
+        index, ok, error = result
+        stats['verified'] += 1
+        if ok:
+            stats['valid'] += 1
+        else:
+            stats['invalid'] += 1
+        if error:
+            stats['errors'] += 1
+        stats['seconds'] = time.time() - start
+        if stats['seconds'] > 0:
+            stats['per_second'] = stats['verified'] / stats['seconds']
+        return index, ok
+
+    if workers is None or workers < 2:
+        keys = HssPublicKeyCache(BatchPublicKeys)
+        for task in tasks(False):
+            yield count(_batch_verify(task, keys))
+        return
+    pool = multiprocessing.Pool(workers, _batch_init, (BatchPublicKeys,))
+    try:
+        if ordered:
+            results = pool.imap(_batch_verify, tasks(True), chunksize)
+        else:
+            results = pool.imap_unordered(_batch_verify, tasks(True),
+                                          chunksize)
+        for result in results:
+            yield count(result)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -35,8 +35,11 @@
 # WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import io
 import os
+import sys
 import tempfile
+import time
 import unittest
 from pyhsslms import *
 from pyhsslms.compat import fromHex, toHex, toBytes, charNum, u8, u32
@@ -56,6 +59,18 @@ class TestCoef(unittest.TestCase):
         self.assertEqual(1, coef(S, 0, 4))
 
 
+class TestWinternitzCodec(unittest.TestCase):
+
+    def testMatchesCoefChecksum(self):
+        hash1 = fromHex('00ff8001' + '5a'*20 + 'c3e7100f2d4b6987')
+        for lmots_type in pyhsslms.lmots_params:
+            alg, n, p, w, ls = pyhsslms.lmots_params[lmots_type]
+            V = hash1[0:n] + checksum(hash1[0:n], w, ls)
+            expected = [coef(V, i, w) for i in range(0, p)]
+            digits = lmots_codec(lmots_type).digits(hash1[0:n])
+            self.assertEqual(expected, digits)
+
+
 class TestHash(unittest.TestCase):
 
     def testSHA256(self):
@@ -79,6 +94,29 @@ class TestHash(unittest.TestCase):
         self.assertEqual(known[0:24], hv)
 
 
+class TestLmotsChain(unittest.TestCase):
+
+    def testMatchesH(self):
+        I = fromHex('1'*32)
+        q = u32(7)
+        SEED = fromHex('3'*64)
+        for lmots_type in pyhsslms.lmots_params:
+            alg, n, p, w, ls = pyhsslms.lmots_params[lmots_type]
+            chain = pyhsslms.LmotsChain(lmots_type, I, q)
+            for i in (0, p-1):
+                tmp = pyhsslms.H(alg, I + q + pyhsslms.u16(i) + \
+                                 pyhsslms.D_PRG + SEED[0:n], n)
+                self.assertEqual(tmp, chain.start(i, SEED[0:n]))
+                expected = tmp
+                for j in range(0, 3):
+                    expected = pyhsslms.H(alg, I + q + pyhsslms.u16(i) + \
+                                          u8(j) + expected, n)
+                self.assertEqual(expected, chain.run(i, tmp, 0, 3))
+                self.assertEqual(expected, chain.run(i,
+                                 chain.run(i, tmp, 0, 1), 1, 3))
+                self.assertEqual(tmp, chain.run(i, tmp, 3, 3))
+
+
 class TestLMOTS(unittest.TestCase):
 
     def testChecksum(self):
@@ -255,6 +293,111 @@ class TestLMS(unittest.TestCase):
         self.assertTrue(prv.prettyPrint())
         self.assertTrue(pub.prettyPrint())
 
+    def testOtsKeysDerivedOnDemand(self):
+        prv = pyhsslms.LmsPrivateKey()
+        self.assertFalse(hasattr(prv, 'ots_priv'))
+        self.assertFalse(hasattr(prv, 'ots_pub'))
+        ots_prv = prv.otsPrivateKey(3)
+        self.assertEqual(prv.I, ots_prv.I)
+        self.assertEqual(u32(3), ots_prv.q)
+        K = ots_prv.publicKey().K
+        leaf = pyhsslms.H('sha256', prv.I + u32(32+3) + \
+                          pyhsslms.D_LEAF + K, 32)
+        self.assertEqual(leaf, prv.path(32+2)[0])
+
+    def testTreehash(self):
+        prv = pyhsslms.LmsPrivateKey(lmots_type=lmots_sha256_n32_w2)
+        seen = {}
+        th = pyhsslms.LmsTreehash(prv.lms_type, prv.lmots_type,
+                                  prv.I, prv.SEED, 1,
+                                  observer=seen.__setitem__)
+        deepest = 0
+        while not th.done:
+            th.update()
+            deepest = max(deepest, len(th.stack))
+        self.assertEqual(prv.pub, th.node)
+        self.assertTrue(deepest <= 5)
+        self.assertEqual(63, len(seen))
+        for r in range(1, 64):
+            self.assertEqual(prv._nodes[r], seen[r])
+        th = pyhsslms.LmsTreehash(prv.lms_type, prv.lmots_type,
+                                  prv.I, prv.SEED, 5)
+        self.assertEqual(prv._nodes[5], th.run())
+
+    def testNodeStore(self):
+        prv = LmsPrivateKey(lms_sha256_m32_h5, lmots_sha256_n32_w8)
+        self.assertTrue(isinstance(prv._nodes, LmsNodeStore))
+        self.assertEqual(len(prv._nodes.buffer), 2**6 * 32)
+        copy = LmsNodeStore(prv.lms_type, bytearray(prv._nodes.buffer))
+        for r in range(1, 2**6):
+            self.assertEqual(copy[r], prv._nodes[r])
+        self.assertEqual(prv._nodes[1], prv.publicKey().K)
+        prv = LmsPrivateKey(lms_sha256_m32_h5, lmots_sha256_n32_w8,
+                            cache_levels=2)
+        self.assertEqual(len(prv._nodes.buffer), 2**3 * 32)
+
+    def testWorkers(self):
+        prv = pyhsslms.LmsPrivateKey(lmots_type=lmots_sha256_n32_w2)
+        prv2 = pyhsslms.LmsPrivateKey(lmots_type=lmots_sha256_n32_w2,
+                   SEED=prv.SEED, I=prv.I, workers=2)
+        self.assertEqual(prv.pub, prv2.pub)
+        self.assertEqual(prv._nodes.buffer, prv2._nodes.buffer)
+        prv3 = pyhsslms.LmsPrivateKey(lmots_type=lmots_sha256_n32_w2,
+                   SEED=prv.SEED, I=prv.I, q=9, cache_levels=1, workers=2)
+        self.assertEqual(prv.pub, prv3.pub)
+        self.assertEqual(prv.path(9+32), prv3.path(9+32))
+
+    def testTraversal(self):
+        msg = toBytes('The way to get started is to quit talking and ' + \
+                      'begin doing.')
+        full = pyhsslms.LmsPrivateKey(lmots_type=lmots_sha256_n32_w2)
+        for cache_levels in (0, 2):
+            prv = pyhsslms.LmsPrivateKey(lmots_type=lmots_sha256_n32_w2,
+                      SEED=full.SEED, I=full.I, q=5,
+                      cache_levels=cache_levels)
+            self.assertEqual(full.pub, prv.pub)
+            self.assertTrue(len(prv._nodes) < 2**(cache_levels+1))
+            pub = prv.publicKey()
+            for q in range(5, 32):
+                self.assertEqual(full.path(q+32), prv.path(q+32))
+                sigbuffer = prv.sign(msg)
+                self.assertTrue(pub.verify(msg, sigbuffer))
+            self.assertTrue(prv.is_exhausted())
+            with self.assertRaises(ValueError):
+                prv.sign(msg)
+
+    def testTraversalSchedule(self):
+        # cheap leaves, so that every leaf of a taller tree is used
+        publicKey = pyhsslms.LmotsPrivateKey.publicKey
+        def leaf_key(prv):
+            K = pyhsslms.H('sha256', prv.I + prv.q + prv.SEED, 32)
+            return pyhsslms.LmotsPublicKey(prv.I, prv.q, K, prv.type)
+        pyhsslms.LmotsPrivateKey.publicKey = leaf_key
+        try:
+            full = pyhsslms.LmsPrivateKey(lms_sha256_m32_h10,
+                                          lmots_sha256_n32_w2)
+            for cache_levels in (0, 3, 6, 9):
+                prv = pyhsslms.LmsPrivateKey(lms_sha256_m32_h10,
+                          lmots_sha256_n32_w2, SEED=full.SEED, I=full.I,
+                          cache_levels=cache_levels)
+                for q in range(0, 1024):
+                    self.assertEqual(full.path(q+1024), prv.path(q+1024))
+                    prv.q += 1
+                    prv._traversal.advance(q)
+            # fewer leaves for each signature than the schedule needs
+            nodes = dict([(r, full._nodes[r]) for r in range(1, 2048)])
+            self.assertRaises(ValueError, pyhsslms.LmsTraversal,
+                              lms_sha256_m32_h10, lmots_sha256_n32_w2,
+                              full.I, full.SEED, 0, 7, nodes, 12)
+            traversal = pyhsslms.LmsTraversal(lms_sha256_m32_h10,
+                            lmots_sha256_n32_w2, full.I, full.SEED, 0, 7,
+                            nodes)
+            traversal.budget = 1
+            self.assertRaises(ValueError, lambda:
+                              [traversal.advance(q) for q in range(0, 8)])
+        finally:
+            pyhsslms.LmotsPrivateKey.publicKey = publicKey
+
     def testRandomPublicKeySerializeDeserialize(self):
         msg = toBytes('The way to get started is to quit talking and ' + \
                       'begin doing.')
@@ -398,6 +541,188 @@ class TestHSS(unittest.TestCase):
         self.assertEqual(prv.prettyPrint(), prv_deserialized.prettyPrint())
 
 
+    def testSignatureView(self):
+        msg = toBytes('The way to get started is to quit talking and ' + \
+                      'begin doing.')
+        prv = pyhsslms.HssPrivateKey(levels=3, lmots_type=lmots_sha256_n32_w4)
+        pub = prv.publicKey()
+        sigbuffer = prv.sign(msg)
+        view = pyhsslms.HssSignatureView(sigbuffer)
+        sig = pyhsslms.HssSignature.deserialize(sigbuffer)
+        self.assertEqual(3, view.levels)
+        for i in range(0, 2):
+            self.assertEqual(sig.pub[i].serialize(),
+                             view.pubBuffer(i).tobytes())
+            self.assertEqual(sig.sig[i].q, view.sig[i].q)
+            self.assertEqual(sig.sig[i].path[4],
+                             view.sig[i].path(4).tobytes())
+        self.assertEqual(sig.lms_sig.lmots_sig.y[3],
+                         view.lms_sig.y(3).tobytes())
+        self.assertTrue(isinstance(view.lms_sig.path(0), memoryview))
+        self.assertEqual(len(sigbuffer), view.lms_sig.end)
+        self.assertTrue(pub.verify(msg, bytearray(sigbuffer)))
+        self.assertTrue(pub.verify(msg, memoryview(sigbuffer)))
+        self.assertFalse(pub.verify(msg, mangle(bytearray(sigbuffer))))
+        self.assertRaises(ValueError, pub.verify, msg, sigbuffer[:-1])
+
+    def testMixedLevels(self):
+        params = [(lms_sha256_m32_h10, lmots_sha256_n32_w1),
+                  (lms_sha256_m32_h5, lmots_sha256_n32_w4)]
+        prv = HssPrivateKey(params=params)
+        self.assertEqual(prv.levels, 2)
+        self.assertEqual(prv.maxSignatures(), 2**15)
+        pub = prv.publicKey()
+        msg = toBytes('Mixed heights in one hierarchy.')
+        for i in range(0, 33):
+            sig = prv.sign(msg)
+        self.assertTrue(pub.verify(msg, sig))
+        self.assertEqual(prv.prv[1].lmots_type, lmots_sha256_n32_w4)
+        self.assertEqual(prv.remaining(), 2**15 - 33)
+        prv2 = HssPrivateKey.deserialize(prv.serialize())
+        self.assertEqual(prv2.params, params)
+        self.assertEqual(prv2.remaining(), 2**15 - 33)
+        self.assertTrue(pub.verify(msg, prv2.sign(msg)))
+        # a buffer without the key of the second level
+        buffer = prv.serialize()
+        root = 8 + 4 + len(prv.prv[0].serialize())
+        self.assertRaises(ValueError, HssPrivateKey.deserialize,
+                          buffer[0:root])
+        params[1] = (lms_sha256_m24_h5, lmots_sha256_n24_w4)
+        self.assertRaises(ValueError, HssPrivateKey, params=params)
+
+    def testAmortizedNextTree(self):
+        prv = HssPrivateKey(levels=2, lms_type=lms_sha256_m32_h5,
+                            lmots_type=lmots_sha256_n32_w4, amortize=True)
+        pub = prv.publicKey()
+        msg = toBytes('One leaf of the next tree with each signature.')
+        length = len(prv.serialize())
+        for i in range(0, 10):
+            prv.sign(msg)
+        self.assertEqual(prv.nextLeaves(), 10)
+        buffer = prv.serialize()
+        self.assertTrue(len(buffer) - length < 256)
+        prv = HssPrivateKey.deserialize(buffer, amortize=True)
+        self.assertEqual(prv.serialize(), buffer)
+        self.assertEqual(prv.nextLeaves(), 10)
+        plain = HssPrivateKey.deserialize(buffer)
+        self.assertEqual(plain.next, {})
+        self.assertEqual(plain.remaining(), prv.remaining())
+        for i in range(10, 32):
+            prv.sign(msg)
+        tree = prv.next[1][0]
+        self.assertEqual(prv.nextLeaves(), 32)
+        sig = prv.sign(msg)
+        self.assertTrue(prv.prv[1] is tree)
+        self.assertTrue(pub.verify(msg, sig))
+        self.assertEqual(prv.nextLeaves(), 1)
+
+    def testAmortizedNextTreeCached(self):
+        prv = HssPrivateKey(levels=2, lms_type=lms_sha256_m32_h5,
+                            lmots_type=lmots_sha256_n32_w4, amortize=True,
+                            cache_levels=2)
+        pub = prv.publicKey()
+        msg = toBytes('The top nodes of the next tree are saved.')
+        for i in range(0, 12):
+            prv.sign(msg)
+        buffer = prv.serialize()
+        prv = HssPrivateKey.deserialize(buffer, amortize=True,
+                                        cache_levels=2)
+        self.assertEqual(prv.serialize(), buffer)
+        self.assertEqual(prv.nextLeaves(), 12)
+        for i in range(12, 32):
+            prv.sign(msg)
+        sig = prv.sign(msg)
+        self.assertTrue(pub.verify(msg, sig))
+
+    def testSignInto(self):
+        prv = HssPrivateKey(levels=2, lms_type=lms_sha256_m32_h5,
+                            lmots_type=lmots_sha256_n32_w8)
+        pub = prv.publicKey()
+        msg = toBytes('Written into the buffer of the caller.')
+        length = prv.signatureLength()
+        self.assertEqual(len(prv.sign(msg)), length)
+        prefix = prv.signaturePrefix()
+        self.assertTrue(prv.signaturePrefix() is prefix)
+        out = bytearray(length + 8)
+        self.assertEqual(prv.signInto(msg, memoryview(out), 4), length)
+        self.assertTrue(pub.verify(msg, bytes(out[4:4+length])))
+        self.assertEqual(out[0:4], bytearray(4))
+        self.assertRaises(ValueError, prv.signInto, msg, out, 9)
+        for i in range(0, 31):
+            prv.sign(msg)
+        self.assertFalse(prv.signaturePrefix() is prefix)
+        self.assertEqual(prv.signInto(msg, out), length)
+        self.assertTrue(pub.verify(msg, bytes(out[0:length])))
+
+    def testKeygenSteps(self):
+        keygen = HssKeygen(levels=2, lms_type=lms_sha256_m32_h5,
+                           lmots_type=lmots_sha256_n32_w4)
+        leaves = []
+        for progress in keygen.steps():
+            leaves.append(progress.leaves)
+        self.assertEqual(leaves, sorted(leaves))
+        self.assertEqual(leaves[-1], 64)
+        self.assertTrue(progress.done)
+        self.assertEqual(progress.computed, 64)
+        self.assertEqual(progress.hashes, 64*((67*16) + 3))
+        self.assertEqual(progress.eta(), 0)
+        prv = keygen.key
+        msg = toBytes('The way to get started is to quit talking.')
+        self.assertTrue(prv.publicKey().verify(msg, prv.sign(msg)))
+
+    def testParallelLevels(self):
+        keygen = HssKeygen(levels=3, lms_type=lms_sha256_m32_h5,
+                           lmots_type=lmots_sha256_n32_w2, workers=2)
+        levels = set()
+        for progress in keygen.steps():
+            levels.add(progress.levels_done)
+        self.assertEqual(progress.leaves, 96)
+        self.assertEqual(progress.computed, 96)
+        self.assertEqual(levels, set([0, 1, 2, 3]))
+        prv = keygen.key
+        for tree in prv.prv:
+            serial = pyhsslms.LmsPrivateKey(lmots_type=lmots_sha256_n32_w2,
+                         SEED=tree.SEED, I=tree.I)
+            self.assertEqual(serial.pub, tree.pub)
+        msg = toBytes('The way to get started is to quit talking.')
+        pub = prv.publicKey()
+        self.assertTrue(pub.verify(msg, prv.sign(msg)))
+        prv2 = pyhsslms.HssPrivateKey.deserialize(prv.serialize(), workers=2)
+        self.assertEqual(pub.serialize(), prv2.publicKey().serialize())
+        self.assertTrue(pub.verify(msg, prv2.sign(msg)))
+
+    def testPublicKeyCache(self):
+        msg = toBytes('The way to get started is to quit talking and ' + \
+                      'begin doing.')
+        prv = pyhsslms.HssPrivateKey(levels=3, lmots_type=lmots_sha256_n32_w4)
+        pub = pyhsslms.HssPublicKey.deserialize(prv.publicKey().serialize(),
+                                                cache_size=1)
+        sigs = [prv.sign(msg) for i in range(0, 33)]
+        for sigbuffer in sigs[0:3]:
+            self.assertTrue(pub.verify(msg, sigbuffer))
+        self.assertEqual((1, 2), (pub.cache.misses, pub.cache.hits))
+        self.assertFalse(pub.verify(mangle(msg), sigs[0]))
+        self.assertFalse(pub.verify(msg, mangle(sigs[0])))
+        self.assertEqual((2, 3), (pub.cache.misses, pub.cache.hits))
+        # the last signature is from a new bottom tree
+        self.assertTrue(pub.verify(msg, sigs[32]))
+        self.assertTrue(pub.verify(msg, sigs[0]))
+        self.assertEqual((4, 3), (pub.cache.misses, pub.cache.hits))
+        self.assertEqual(1, len(pub.cache))
+
+    def testTraversalSerializeDeserialize(self):
+        msg = toBytes('The way to get started is to quit talking and ' + \
+                      'begin doing.')
+        prv = pyhsslms.HssPrivateKey(levels=2, cache_levels=1)
+        pub = prv.publicKey()
+        for i in range(0, 40):
+            sigbuffer = prv.sign(msg)
+            self.assertTrue(pub.verify(msg, sigbuffer))
+        prv2 = pyhsslms.HssPrivateKey.deserialize(prv.serialize(),
+                                                  cache_levels=1)
+        self.assertEqual(prv.remaining(), prv2.remaining())
+        self.assertTrue(pub.verify(msg, prv2.sign(msg)))
+
     def testSmallRandomPrivateKey(self):
         msg = toBytes('The way to get started is to quit talking and ' + \
                       'begin doing.')
@@ -484,6 +809,343 @@ class TestHSSLMS(unittest.TestCase):
         self.assertFalse(pub_key.verify(msg, mangle(sigbuf)))
         self.assertFalse(pub_key.verify(mangle(msg), sigbuf))
 
+    def testSignVerifyFileInPieces(self):
+        msg = toBytes('This is a test message to be signed.\n') * 10
+        with open(self.fname, 'wb') as f:
+            f.write(msg)
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                      lmots_type=lmots_sha256_n32_w2)
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        chunk_size = pyhsslms.FileChunkSize
+        stdin, stdout = sys.stdin, sys.stdout
+        pyhsslms.FileChunkSize = 7
+        try:
+            self.assertTrue(prv_key.signFile(self.fname))
+            self.assertTrue(pub_key.verifyFile(self.fname))
+            # '-' reads the message from stdin; the signature goes to stdout
+            sys.stdin = io.BytesIO(msg)
+            sys.stdout = io.BytesIO()
+            self.assertTrue(prv_key.signFile('-'))
+            sigbuf = sys.stdout.getvalue()
+            sys.stdin = io.BytesIO(msg)
+            self.assertTrue(pub_key.verifyFile('-', self.fname + '.sig'))
+            sys.stdin = io.BytesIO(mangle(msg))
+            self.assertFalse(pub_key.verifyFile('-', self.fname + '.sig'))
+        finally:
+            pyhsslms.FileChunkSize = chunk_size
+            sys.stdin, sys.stdout = stdin, stdout
+        self.assertTrue(pub_key.verify(msg, sigbuf))
+
+    def testVerifyMany(self):
+        msg = toBytes('This is a test message to be signed.\n')
+        with open(self.fname, 'wb') as f:
+            f.write(msg)
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                      lmots_type=lmots_sha256_n32_w2)
+        self.assertTrue(prv_key.signFile(self.fname))
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        items = [(pub_key, msg, prv_key.sign(msg)) for i in range(0, 6)]
+        items.append((pub_key.hss_pub.serialize(), mangle(msg), items[0][2]))
+        items.append((pub_key, u'' + self.fname, u'' + self.fname + '.sig'))
+        items.append((pub_key, msg, toBytes('')))
+        expected = [True] * 6 + [False, True, False]
+        for workers in (None, 2):
+            stats = {}
+            results = list(pyhsslms.verify_many(items, workers=workers,
+                                                stats=stats))
+            self.assertEqual(list(enumerate(expected)), results)
+            self.assertEqual((9, 7, 2, 1), (stats['verified'], stats['valid'],
+                                            stats['invalid'], stats['errors']))
+        results = pyhsslms.verify_many(items, workers=2, ordered=False)
+        self.assertEqual(list(enumerate(expected)), sorted(results))
+        # without workers, the cache of the given public key is used
+        pub = pyhsslms.HssPublicKey.deserialize(pub_key.hss_pub.serialize(),
+                                                cache_size=4)
+        items = [(pub, msg, sig) for pk, m, sig in items[0:6]]
+        items.append((toBytes(''), msg, items[0][2]))
+        stats = {}
+        results = list(pyhsslms.verify_many(items, stats=stats))
+        self.assertEqual(list(enumerate([True] * 6 + [False])), results)
+        self.assertEqual((1, 5), (pub.cache.misses, pub.cache.hits))
+        self.assertEqual(1, stats['errors'])
+
+    def testGenkeyResume(self):
+        class Stop(Exception):
+            pass
+        saves = []
+        save = pyhsslms.HssKeygenState.save
+        def stopping_save(state):
+            save(state)
+            saves.append(state)
+            if len(saves) == 5:
+                raise Stop()
+        pyhsslms.HssKeygenState.save = stopping_save
+        try:
+            self.assertRaises(Stop, pyhsslms.HssLmsPrivateKey.genkey,
+                              self.keyname, levels=2, checkpoint=4)
+        finally:
+            pyhsslms.HssKeygenState.save = save
+        state_filename = self.keyname + '.genkey-state'
+        self.assertTrue(os.path.exists(state_filename))
+        self.assertFalse(os.path.exists(self.keyname + '.prv'))
+        with open(state_filename, 'rb') as f:
+            self.assertRaises(ValueError, pyhsslms.HssPrivateKey.deserialize,
+                              f.read())
+        state = HssKeygenState(state_filename,
+                               [(lms_sha256_m32_h5, lmots_sha256_n32_w8)]*2)
+        state.load()
+        self.assertEqual(state.trees[0].leaves(), 20)
+        self.assertRaises((IOError, OSError),
+                          pyhsslms.HssLmsPrivateKey.genkey, self.keyname,
+                          levels=2, checkpoint=4)
+        steps = []
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                                                   workers=2, checkpoint=4,
+                                                   resume=True,
+                                                   progress=steps.append)
+        self.assertTrue(steps[-1].done)
+        self.assertEqual(steps[-1].computed, 64 - 20)
+        self.assertFalse(os.path.exists(state_filename))
+        self.assertEqual(prv_key.hss_prv.prv[0].I, state.trees[0].I)
+        msg = toBytes('This is a test message to be signed.\n')
+        sigbuf = prv_key.sign(msg)
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        self.assertTrue(pub_key.verify(msg, sigbuf))
+
+    def testGenkeyCheckpointFile(self):
+        class Stop(Exception):
+            pass
+        def stop(step):
+            if step.computed >= 24:
+                raise Stop()
+        params = [(lms_sha256_m32_h5, lmots_sha256_n32_w4)]*2
+        self.assertRaises(Stop, pyhsslms.HssLmsPrivateKey.genkey,
+                          self.keyname, levels=2,
+                          lmots_type=lmots_sha256_n32_w4, checkpoint=4,
+                          progress=stop)
+        state_filename = self.keyname + '.genkey-state'
+        # the nodes are not in the state file
+        self.assertTrue(os.path.getsize(state_filename) <
+                        LmsNodeStore.sizeof(lms_sha256_m32_h5))
+        state = HssKeygenState(state_filename, params)
+        state.load()
+        tree = state.trees[0]
+        self.assertEqual(tree.leaves(), 24)
+        full = LmsPrivateKey(lms_type=lms_sha256_m32_h5,
+                             lmots_type=lmots_sha256_n32_w4,
+                             SEED=tree.SEED, I=tree.I)
+        for r in tree.roots:
+            first, last = r, r + 1
+            while first < 64:
+                for i in range(first, last):
+                    self.assertEqual(tree.store[i], full._nodes[i])
+                first, last = 2*first, 2*last
+        os.rename(state.nodes_filename, state.nodes_filename + '.x')
+        self.assertRaises(ValueError, state.load)
+        os.rename(state.nodes_filename + '.x', state.nodes_filename)
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                                                   lmots_type=lmots_sha256_n32_w4,
+                                                   checkpoint=4, resume=True)
+        self.assertFalse(os.path.exists(state.nodes_filename))
+        self.assertEqual(prv_key.hss_prv.pub[0].K, full.publicKey().K)
+        msg = toBytes('Resumed from the checkpoint files.')
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+
+    def testPrecompute(self):
+        msg = toBytes('This is a test message to be signed.\n')
+        pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                                         lmots_type=lmots_sha256_n32_w4)
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, precompute=4)
+        cache = prv_key.hss_prv.prv[-1].checkpoints
+        self.assertEqual(4, prv_key.fill())
+        self.assertEqual(0, prv_key.fill())
+        buffers = [e.buffer for e in cache._entries.values()]
+        for i in range(0, 4):
+            self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        # the used checkpoints are zeroed
+        self.assertEqual(0, len(cache))
+        for buffer in buffers:
+            self.assertEqual(bytearray(len(buffer)), buffer)
+        # signing without checkpoints, and after the bottom tree changes
+        for i in range(0, 30):
+            self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        self.assertFalse(cache is prv_key.hss_prv.prv[-1].checkpoints)
+        prv_key.close()
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, precompute=2,
+                                            background=True)
+        cache = prv_key.hss_prv.prv[-1].checkpoints
+        while len(cache) < 2:
+            time.sleep(0.01)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        prv_key.close()
+        self.assertEqual(None, cache._thread)
+
+    def testPrecomputeSteps(self):
+        msg = toBytes('This is a test message to be signed.\n')
+        steps = []
+        run = pyhsslms.LmotsChain._run_sha256
+        def counting_run(chain, i, tmp, start, end):
+            steps.append(max(0, end - start))
+            return run(chain, i, tmp, start, end)
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=1,
+                      lmots_type=lmots_sha256_n32_w8, precompute=2)
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        cache = prv_key.hss_prv.prv[-1].checkpoints
+        self.assertEqual(16, cache.interval)
+        self.assertEqual(2, prv_key.fill())
+        pyhsslms.LmotsChain._run_sha256 = counting_run
+        try:
+            self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+            del steps[34:]
+            self.assertTrue(max(steps) < 16)
+            with_checkpoints = sum(steps)
+            del steps[:]
+            prv_key.close()
+            self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+            del steps[34:]
+        finally:
+            pyhsslms.LmotsChain._run_sha256 = run
+        self.assertTrue(with_checkpoints*4 < sum(steps))
+        self.assertEqual(4, LmotsCheckpoints.defaultInterval(
+                                lmots_sha256_n32_w4))
+
+    def testAuxData(self):
+        msg = toBytes('This is a test message to be signed.\n')
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                      lmots_type=lmots_sha256_n32_w2, aux=True)
+        self.assertTrue(os.path.exists(self.keyname + '.aux'))
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, aux=True)
+        self.assertFalse(prv_key.aux.updated)
+        for prv in prv_key.hss_prv.prv:
+            self.assertTrue(isinstance(prv._nodes, pyhsslms.LmsNodeStore))
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        # damage a node; the level is computed again and the file is fixed
+        with open(self.keyname + '.aux', 'r+b') as f:
+            f.seek(200)
+            b = f.read(1)
+            f.seek(200)
+            f.write(u8(charNum(b[0]) ^ 1))
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, aux=True)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, aux=True,
+                                            cache_levels=1)
+        self.assertFalse(prv_key.aux.updated)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        # the sidecar is saved again with the tree made by refresh()
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, aux=True)
+        for i in range(0, 32):
+            self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        I = prv_key.hss_prv.prv[-1].I
+        self.assertEqual(1, prv_key.hss_prv.generation)
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, aux=True)
+        self.assertFalse(prv_key.aux.updated)
+        self.assertEqual(I, prv_key.hss_prv.prv[-1].I)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        with open(self.keyname + '.aux', 'r+b') as f:
+            f.seek(12)
+            f.write(fromHex('0000ffff'))
+        aux = pyhsslms.HssAuxData(self.keyname + '.aux')
+        self.assertEqual([], aux._entries)
+        self.assertEqual((None, None), aux.lookup(0, fromHex('0000ffff')*2))
+
+    def testReserve(self):
+        msg = toBytes('This is a test message to be signed.\n')
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                      lmots_type=lmots_sha256_n32_w2, reserve=10)
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        for i in range(0, 12):
+            self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+            if i == 0:
+                with open(self.keyname + '.prv', 'rb') as f:
+                    state = f.read()
+            elif i < 10:
+                with open(self.keyname + '.prv', 'rb') as f:
+                    self.assertEqual(state, f.read())
+        # the key was stopped after 12 signatures; 20 leaves are skipped
+        prv = pyhsslms.HssLmsPrivateKey(self.keyname).hss_prv
+        self.assertEqual(1024 - 20, prv.remaining())
+        self.assertEqual(20, prv.prv[-1].q)
+
+    def testStateWrittenInPlace(self):
+        msg = toBytes('This is a test message to be signed.\n')
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                      lmots_type=lmots_sha256_n32_w2, sync='fdatasync')
+        inode = os.stat(self.keyname + '.prv').st_ino
+        for i in range(0, 33):
+            self.assertTrue(len(prv_key.sign(msg)) > 0)
+            with open(self.keyname + '.prv', 'rb') as f:
+                self.assertEqual(prv_key.hss_prv.serialize(), f.read())
+            if i < 32:
+                self.assertEqual(inode, os.stat(self.keyname + '.prv').st_ino)
+        # a new bottom tree replaces the file
+        self.assertNotEqual(inode, os.stat(self.keyname + '.prv').st_ino)
+        self.assertFalse(os.path.exists(self.keyname + '.prv.tmp'))
+        self.assertRaises(ValueError, pyhsslms.HssLmsPrivateKey,
+                          self.keyname, sync='always')
+
+    def testLazyOpen(self):
+        msg = toBytes('This is a test message to be signed.\n')
+        pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                      lmots_type=lmots_sha256_n32_w2).sign(msg)
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, lazy=True)
+        self.assertTrue(all(prv.pub is None for prv in prv_key.hss_prv.prv))
+        self.assertEqual(1024 - 1, prv_key.remaining())
+        self.assertEqual(1024, prv_key.maxSignatures())
+        self.assertTrue('(not computed)' in prv_key.hss_prv.prettyPrint())
+        with open(self.keyname + '.prv', 'rb') as f:
+            self.assertEqual(prv_key.hss_prv.serialize(), f.read())
+        prv_key.warm(background=True)
+        sigbuf = prv_key.sign(msg)
+        self.assertEqual(prv_key.signatureLength(), len(sigbuf))
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        self.assertTrue(pub_key.verify(msg, sigbuf))
+        # the trees are computed before the first signature
+        prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, lazy=True)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+        self.assertEqual(1024 - 3, prv_key.remaining())
+        # the sidecar is not hashed until the trees are needed
+        pyhsslms.HssLmsPrivateKey(self.keyname, aux=True).close()
+        digests = []
+        digest = pyhsslms.LmsNodeStore.digest
+        def counting_digest(store, key):
+            digests.append(key)
+            return digest(store, key)
+        pyhsslms.LmsNodeStore.digest = counting_digest
+        try:
+            prv_key = pyhsslms.HssLmsPrivateKey(self.keyname, aux=True,
+                                                lazy=True)
+            self.assertEqual([], digests)
+            prv_key.warm()
+            self.assertEqual(2, len(digests))
+        finally:
+            pyhsslms.LmsNodeStore.digest = digest
+        self.assertFalse(prv_key.aux.updated)
+        self.assertTrue(pub_key.verify(msg, prv_key.sign(msg)))
+
+    def testSignerVerifier(self):
+        msg = toBytes('This is a test message to be signed.\n') * 100
+        prv_key = pyhsslms.HssLmsPrivateKey.genkey(self.keyname, levels=2,
+                      lmots_type=lmots_sha256_n32_w2)
+        pub_key = pyhsslms.HssLmsPublicKey(self.keyname)
+        signer = prv_key.signer()
+        for i in range(0, len(msg), 1000):
+            signer.update(msg[i:i+1000])
+        sig = signer.finalize()
+        self.assertRaises(ValueError, signer.update, msg)
+        self.assertTrue(pub_key.verify(msg, sig))
+        verifier = pub_key.verifier(sig)
+        verifier.update(msg[:1500])
+        verifier.update(msg[1500:])
+        self.assertTrue(verifier.finalize())
+        verifier = pub_key.verifier(sig)
+        verifier.update(msg[:-1])
+        self.assertFalse(verifier.finalize())
+        self.assertEqual(1, prv_key.hss_prv.prv[-1].q)
+
     def testFromPublicKeyGetI(self):
         buffer = fromHex('000000010000000500000004' + \
                          '616d2133c3275326e591f26c748e3588' + \